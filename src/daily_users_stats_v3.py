@@ -22,6 +22,7 @@ sys.path.append(str(Path(os.getcwd())))
 from utils.LogWriter import log_location, log_config, log_args
 from utils.Toolbox_lib import create_year_calendar
 from utils.dbclient.DatabaseClient import DbConnector
+from utils.DatabaseClassifier import classify_database_names, report_database_rules
 from module.env import *
 os.environ[ 'MPLCONFIGDIR' ] = '/tmp/'
 
@@ -92,26 +93,7 @@ def create_statistique_requete(condition_year: str, type_data: str , condition_l
     WHEN 1 THEN 'prévisualisation' \
     WHEN 2 THEN 'téléchargement' \
     WHEN 3 THEN 'téléchargement' \
-    END as type_interrogation2, \
-    CASE \
-    WHEN nom_base_interrogee LIKE '%histo_actions%' THEN 'Stocks' \
-    WHEN nom_base_interrogee LIKE '%actions_%' THEN 'Stocks' \
-    WHEN nom_base_interrogee LIKE '%indices_telekurs%' THEN 'Global\Market Indices' \
-    WHEN nom_base_interrogee LIKE '%histo_indices_telekurs%' THEN 'Global\Market Indices' \
-    WHEN nom_base_interrogee LIKE '%indices_eurofidai%' THEN 'Eurofidai Indices' \
-    WHEN nom_base_interrogee LIKE '%histo_indices_eurofidai%' THEN 'IEurofidai Indices' \
-    WHEN nom_base_interrogee LIKE '%corres_code%' THEN 'Code Mapping Table' \
-    WHEN nom_base_interrogee LIKE '%fonds_mutuel_%' THEN 'Mutual Funds' \
-    WHEN nom_base_interrogee LIKE '%change%' THEN 'Spot Exchange Rate' \
-    WHEN nom_base_interrogee LIKE '%histo_ost%' THEN 'Corporate Events' \
-    WHEN nom_base_interrogee LIKE 'ost%' THEN 'Corporate Events' \
-    WHEN nom_base_interrogee LIKE '%esg%' THEN 'ESG' \
-    WHEN nom_base_interrogee LIKE '%greenbonds%' THEN 'Green Bonds' \
-    END as database_name2, \
-    CASE \
-    WHEN nom_base_interrogee LIKE '%histo%' THEN 'Search_Code' \
-    ELSE 'Extract_Data' \
-    END AS code_ou_data \
+    END as type_interrogation2 \
     FROM statistique_requete as sr LEFT JOIN institution_entity as node \
     ON sr.id_groupe_labo=node.id \
     WHERE {condition_year} AND  nom_groupe_labo NOT IN ('EUROFIDAI','administrateur Drupal') AND  nom_groupe_labo IS NOT NULL\
@@ -130,6 +112,8 @@ def create_statistique_requete(condition_year: str, type_data: str , condition_l
              ORDER BY  ie.name, ufd.uid ;"
 
     df_stats_daily_users = DbConnector('yakari', echo=True).execute_query(req_extraction_stats)
+    # database_name2 and code_ou_data of the distinct database names (see utils.DatabaseClassifier)
+    df_stats_daily_users = classify_database_names(df_stats_daily_users, categorical=False)
     df_stats_daily_subscription = DbConnector('yakari', echo=True).execute_query(req_extraction_stats_users)
     df_stats_users_with_subscription = df_stats_daily_users.merge(df_stats_daily_subscription, how='left', left_on='id_user', right_on='id_user')
     df_stats_users_with_subscription = df_stats_users_with_subscription[df_stats_users_with_subscription['labo_name'].isnull() == False].drop_duplicates()
@@ -433,5 +417,6 @@ def main():
 
 if __name__ == "__main__":
     main()
+    report_database_rules()
     end_time=datetime.datetime.now()
     print(f"\nStart Time: {start_time}\nEnd Time: {end_time}\nDuration: {end_time - start_time}")
\ No newline at end of file
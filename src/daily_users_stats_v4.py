@@ -26,8 +26,9 @@ from pptx.util import Pt
 # sinon python ne trouvera pas les modules à importer
 sys.path.append(str(Path(os.getcwd())))
 from utils.LogWriter import log_location, log_config, log_args
-from utils.Toolbox_lib import create_year_calendar
+from utils.Toolbox_lib import create_year_calendar, match_institutions
 from utils.dbclient.DatabaseClient import DbConnector
+from utils.DatabaseClassifier import classify_database_names, report_database_rules
 from module.env import *
 os.environ[ 'MPLCONFIGDIR' ] = '/tmp/'
 
@@ -102,26 +103,7 @@ def create_statistique_requete(condition_year: str, type_data: str , condition_l
     WHEN 1 THEN 'prévisualisation' \
     WHEN 2 THEN 'téléchargement' \
     WHEN 3 THEN 'téléchargement' \
-    END as type_interrogation2, \
-    CASE \
-    WHEN nom_base_interrogee LIKE '%histo_actions%' THEN 'Stocks' \
-    WHEN nom_base_interrogee LIKE '%actions_%' THEN 'Stocks' \
-    WHEN nom_base_interrogee LIKE '%indices_telekurs%' THEN 'Global\Market Indices' \
-    WHEN nom_base_interrogee LIKE '%histo_indices_telekurs%' THEN 'Global\Market Indices' \
-    WHEN nom_base_interrogee LIKE '%indices_eurofidai%' THEN 'Eurofidai Indices' \
-    WHEN nom_base_interrogee LIKE '%histo_indices_eurofidai%' THEN 'IEurofidai Indices' \
-    WHEN nom_base_interrogee LIKE '%corres_code%' THEN 'Code Mapping Table' \
-    WHEN nom_base_interrogee LIKE '%fonds_mutuel_%' THEN 'Mutual Funds' \
-    WHEN nom_base_interrogee LIKE '%change%' THEN 'Spot Exchange Rate' \
-    WHEN nom_base_interrogee LIKE '%histo_ost%' THEN 'Corporate Events' \
-    WHEN nom_base_interrogee LIKE 'ost%' THEN 'Corporate Events' \
-    WHEN nom_base_interrogee LIKE '%esg%' THEN 'ESG' \
-    WHEN nom_base_interrogee LIKE '%greenbonds%' THEN 'Green Bonds' \
-    END as database_name2, \
-    CASE \
-    WHEN nom_base_interrogee LIKE '%histo%' THEN 'Search_Code' \
-    ELSE 'Extract_Data' \
-    END AS code_ou_data \
+    END as type_interrogation2 \
     FROM statistique_requete as sr LEFT JOIN institution_entity as node \
     ON sr.id_groupe_labo=node.id \
     WHERE {condition_year} AND  nom_groupe_labo NOT IN ('EUROFIDAI','administrateur Drupal') AND  nom_groupe_labo IS NOT NULL AND node.name IS NOT NULL\
@@ -140,6 +122,8 @@ def create_statistique_requete(condition_year: str, type_data: str , condition_l
              ORDER BY  ie.name, ufd.uid ;"
 
     df_stats_daily_users = DbConnector('yakari', echo=True).execute_query(req_extraction_stats)
+    # database_name2 and code_ou_data of the distinct database names (see utils.DatabaseClassifier)
+    df_stats_daily_users = classify_database_names(df_stats_daily_users, categorical=False)
     df_stats_daily_subscription = DbConnector('yakari', echo=True).execute_query(req_extraction_stats_users)
     df_stats_users_with_subscription = df_stats_daily_users.merge(df_stats_daily_subscription, how='left', left_on='id_user', right_on='id_user')
     df_stats_users_with_subscription = df_stats_users_with_subscription[df_stats_users_with_subscription['labo_name'].isnull() == False].drop_duplicates()
@@ -409,43 +393,42 @@ def extract_data(folder_path, institution_list):
     #crée un dictionnaire institutionnel
     institution_data = {}
 
+    # Normalizes institution names to handle case insensitivity and unnecessary characters
+    #creates new institution list that ignores capitalization and unnecessary characters
+    #crée une nouvelle liste d'institutions qui ignore les majuscules et les caractères inutiles
+    institution_list = list(dict.fromkeys(normalize(inst) for inst in institution_list))
+
     for file in os.listdir(folder_path):
         if file.endswith(".csv"):
             try:
                 #reads csv files and formats to ensure path works across many operating systems
                 #lit les fichiers et formats CSV pour garantir que le chemin fonctionne sur de nombreux systèmes d'exploitation
                 df = pd.read_csv(os.path.join(folder_path, file), delimiter = "|")
-                
-                
-                # Normalizes institution names to handle case insensitivity and unnecessary characters
-                normalized_institution_list = []
-                normalized_institution_list = [normalize(inst) for inst in institution_list]
-                
-                #creates new institution list that ignores capitalization and unnecessary characters
-                #crée une nouvelle liste d'institutions qui ignore les majuscules et les caractères inutiles
-                institution_list = normalized_institution_list
 
-                #finds if any part of each row contains an institution
-                #détermine si une partie de chaque ligne contient une institution
-                match_institution = df.apply(lambda row: any(any(normalized_name in normalize(cell)for normalized_name in normalized_institution_list)for cell in row),axis=1)
+                #finds the rows of each institution with a vectorized search in the label columns (labo_name, institution_name)
+                #détermine les lignes de chaque institution par une recherche vectorisée dans les colonnes de libellés
+                institution_masks = match_institutions(df, institution_list)
 
-                #filters dataframe to include only rows where match_institution is True
-                #filtre le dataframe pour inclure uniquement les lignes où match_institution est True
-                if not match_institution.any():
+                #skip the file if no row contains an institution
+                #ignorer le fichier si aucune ligne ne contient d'institution
+                if not institution_masks:
                     continue
-                filtered_df = df[match_institution]
-
-                # If custom columns are defined for this file, use only those columns (if they exist in the DataFrame)
-                if file in select_csv_columns:
-                    columns_to_keep = [col for col in select_csv_columns[file] if col in filtered_df.columns]
-                    filtered_df = filtered_df[columns_to_keep]
-                    filtered_df.drop_duplicates(inplace=True)
-                    filtered_df.reset_index(drop=True, inplace=True)
 
                 for institution in institution_list:
+                    #skip institution if not in file
+                    #ignorer l'établissement s'il n'est pas dans le fichier
+                    if institution not in institution_masks:
+                        continue
+
                     #filters only the rows that contain the current institution
                     #filtre uniquement les lignes qui contiennent l'institution actuelle
-                    institution_rows = filtered_df[filtered_df.apply(lambda row: any(institution in normalize(str(cell)) for cell in row), axis=1)].copy()
+                    institution_rows = df[institution_masks[institution]]
+
+                    # If custom columns are defined for this file, use only those columns (if they exist in the DataFrame)
+                    if file in select_csv_columns:
+                        columns_to_keep = [col for col in select_csv_columns[file] if col in institution_rows.columns]
+                        institution_rows = institution_rows[columns_to_keep]
+                    institution_rows = institution_rows.copy()
 
                     # Attempt to convert year-like float values to integers (e.g., 2022.0 -> 2022)
                     # Essaie de convertir les valeurs de type float en années en entiers (par exemple, 2022.0 -> 2022)
@@ -603,4 +586,5 @@ def main():
             create_institutional_pptx(institution_data, presentation=output_pptx)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
+    report_database_rules()
\ No newline at end of file
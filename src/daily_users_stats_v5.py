@@ -11,14 +11,17 @@ python3  src/daily_users_stats_v3.py"
 
 
 import os
+import json
+import hashlib
 import pandas as pd
 import sys
 import argparse
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 import seaborn as sns
 import matplotlib.pyplot as plt
 from pptx import Presentation
-from pptx.util import Pt
+from pptx.util import Inches, Pt
 
 
 # rajouter dans la variable d'environnement PATH contenant la liste des répertoires systèmes (programme python, librairies, ...)
@@ -26,8 +29,13 @@ from pptx.util import Pt
 # sinon python ne trouvera pas les modules à importer
 sys.path.append(str(Path(os.getcwd())))
 from utils.LogWriter import log_location, log_config, log_args
-from utils.Toolbox_lib import create_year_calendar
-from utils.dbclient.DatabaseClient import DbConnector
+from utils.Toolbox_lib import create_year_calendar, year_range_condition, match_institutions, MONTH_NAMES, \
+    apply_schema, STATS_DAILY_USERS_SCHEMA, STATS_SUBSCRIPTION_SCHEMA
+from utils.dbclient.DatabaseClient import DbConnector, dispose_engines
+from utils.ChartRenderer import get_bar_renderer, close_bar_renderer, chart_digest, chart_is_cached, save_chart_digest
+from utils.TableStore import TABLE_FORMATS, write_table, read_table, list_tables, TableWriter
+from utils.UsageCube import UsageCube
+from utils.DatabaseClassifier import classify_database_names, report_database_rules, DATABASE_NAME2_CLASSIFIER
 from module.env import *
 os.environ[ 'MPLCONFIGDIR' ] = '/tmp/'
 
@@ -39,6 +47,15 @@ WORKDIR = Path("/home/groups/daily/travail/Bertrand/Developpement/daily_users_st
 CHEMIN_RESULTAT = Path(HOME, "drupal_stats_daily_users")
 CHEMIN_RESULTAT.mkdir(parents=True, exist_ok=True)
 CHEMIN_INPUT_CSV = Path(WORKDIR, "input_csv")
+CHEMIN_STORE = Path(WORKDIR, "store")
+# running totals of the extraction since 2020 and the date_heure_extraction watermark (incremental mode)
+INCREMENTAL_STORE = Path(CHEMIN_STORE, "stats_daily_users_totals.pkl")
+INCREMENTAL_CONDITION_YEAR = year_range_condition(start_year=2020)
+# the rows of the last INCREMENTAL_OVERLAP before the watermark are read again by each incremental run, so the rows
+# committed after a run with an older date_heure_extraction are folded too (unless they are older than the overlap)
+INCREMENTAL_OVERLAP = pd.Timedelta(days=1)
+# source columns of the extraction (SELECT distinct): the key of a row, to skip the rows of the overlap already folded
+ROW_KEY_COLUMNS = ['id_user','user_name','id_labo','institution_name','database_name','type_interrogation','nb_codes','date_heure_extraction']
 
 
 parser = argparse.ArgumentParser(description="This script creates statistics for daily users database. \n \
@@ -50,6 +67,27 @@ parser.add_argument('--year', '-y',
 parser.add_argument('--labo', '-l',
                     help="the name of the laboratory", required=False)
 
+parser.add_argument('--chunksize', '-c', type=int,
+                    help="stream the extraction by chunks of this number of rows (optional, default reads it at once; the rows of stats_all_users_with_subscription_informations are then sorted within each chunk only)", required=False)
+
+parser.add_argument('--aggregate', '-a', action='store_true',
+                    help="compute the statistics in PostgreSQL and only fetch the aggregated tables (no raw data CSV)")
+
+parser.add_argument('--jobs', '-j', type=int, default=1,
+                    help="number of worker processes used to render the graphs (optional, default 1, 0 for one per core)")
+
+parser.add_argument('--incremental', '-i', action='store_true',
+                    help=f"only fetch the extractions newer than the last run and merge them into the totals stored in {INCREMENTAL_STORE} (delete it to rebuild)")
+
+parser.add_argument('--force-render', action='store_true',
+                    help="draw every graph and rebuild every PPTX deck again, even if its data did not change since it was saved")
+
+parser.add_argument('--pptx-layout', choices=['text', 'table'], default='text',
+                    help="rows of the PPTX slides as formatted paragraphs (default) or as a native table")
+
+parser.add_argument('--format', '-f', choices=list(TABLE_FORMATS), default='csv',
+                    help="file format of the intermediate stats tables (optional, default csv; parquet and feather keep the dtypes)")
+
 args = parser.parse_args()
 
 
@@ -67,23 +105,36 @@ def create_institution_folder(df_labo: pd.DataFrame):
         CHEMIN_LABO.mkdir(parents=True, exist_ok=True)
 
 
-def get_multiple_locator(n: int) -> int:
-    """ This function returns the multiple locator for the y-axis based on the number of digits in the number.
-    For example, if the number is 1250, it returns 1000, if the number is 158, it returns 100, and so on."""
-    magnitude = 0   
-    multiple = {}
-    while n >= 10:
-        n //= 10
-        magnitude += 1    
-
-    multiple = {0:10, 1:10, 2:100, 3:1000, 4:10000, 5:100000,6:1000000,7:10000000,8:100000000,9:1000000000}
-    return multiple[magnitude]
-
-
-def create_statistique_requete(condition_year: str, type_data: str , condition_labo: str = "") -> pd.DataFrame:
+def extract_statistique_requete(condition_year: str, condition_labo: str = "", chunksize: int = None, aggregate: bool = False,
+                                incremental: bool = False, years: list = None, table_format: str = 'csv') -> dict:
     """
-    This function creates dataframes for daily users database depending on the type of data requested (institution_data, user_data, database_data)
+    This function runs the yakari queries once and builds every dataframe needed for the daily users statistics.
+    The stats tables are written once per extraction, in table_format (csv, parquet or feather, see utils.TableStore).
+    If chunksize is given, the extraction is streamed by chunks of chunksize rows so that the memory use does not
+    grow with the extraction history; 'users_with_subscription' is then only written to disk (None in the result),
+    its rows sorted by (labo_name, id_user) within each chunk only: sorting the whole file would load it in memory.
+    If aggregate is True, the statistics are computed by PostgreSQL (see extract_aggregated_statistique_requete)
+    and the raw_data_stats_daily_users table is not written.
+    If incremental is True, only the rows newer than the stored watermark (minus INCREMENTAL_OVERLAP) are fetched and the
+    rows not folded yet are added to the stored totals (see load_incremental_store); condition_year is then replaced
+    by the years list, applied to the totals.
+    Returns a dict with the keys 'all', 'laboratory', 'user', 'database' (aggregates) and
+    'subscription', 'users_with_subscription' (subscription dataframes).
     """
+    store = None
+    query_params = None
+    if incremental:
+        if condition_labo:
+            raise ValueError("The incremental extraction covers all the laboratories, condition_labo must be empty.")
+        if aggregate:
+            raise ValueError("The incremental and the aggregate extractions cannot be combined.")
+        # the store covers the whole history since 2020, the requested years are selected from the totals
+        store = load_incremental_store()
+        condition_year = INCREMENTAL_CONDITION_YEAR
+        if store is not None and store['watermark'] is not None:
+            condition_year += " AND date_heure_extraction >= :watermark_start"
+            query_params = {'watermark_start': (pd.Timestamp(store['watermark']) - INCREMENTAL_OVERLAP).to_pydatetime()}
+
     # Connect to the PostgreSQL database server 
     # Extraction Statistics Dataframe  
     req_extraction_stats = f"SELECT distinct id_utilisateur_drupal as id_user, nom_utilisateur as user_name ,id_groupe_labo as id_labo , node.name as institution_name, \
@@ -106,26 +157,7 @@ def create_statistique_requete(condition_year: str, type_data: str , condition_l
     WHEN 1 THEN 'prévisualisation' \
     WHEN 2 THEN 'téléchargement' \
     WHEN 3 THEN 'téléchargement' \
-    END as type_interrogation2, \
-    CASE \
-    WHEN nom_base_interrogee LIKE '%histo_actions%' THEN 'Stocks' \
-    WHEN nom_base_interrogee LIKE '%actions_%' THEN 'Stocks' \
-    WHEN nom_base_interrogee LIKE '%indices_telekurs%' THEN 'Global\Market Indices' \
-    WHEN nom_base_interrogee LIKE '%histo_indices_telekurs%' THEN 'Global\Market Indices' \
-    WHEN nom_base_interrogee LIKE '%indices_eurofidai%' THEN 'Eurofidai Indices' \
-    WHEN nom_base_interrogee LIKE '%histo_indices_eurofidai%' THEN 'IEurofidai Indices' \
-    WHEN nom_base_interrogee LIKE '%corres_code%' THEN 'Code Mapping Table' \
-    WHEN nom_base_interrogee LIKE '%fonds_mutuel_%' THEN 'Mutual Funds' \
-    WHEN nom_base_interrogee LIKE '%change%' THEN 'Spot Exchange Rate' \
-    WHEN nom_base_interrogee LIKE '%histo_ost%' THEN 'Corporate Events' \
-    WHEN nom_base_interrogee LIKE 'ost%' THEN 'Corporate Events' \
-    WHEN nom_base_interrogee LIKE '%esg%' THEN 'ESG' \
-    WHEN nom_base_interrogee LIKE '%greenbonds%' THEN 'Green Bonds' \
-    END as database_name2, \
-    CASE \
-    WHEN nom_base_interrogee LIKE '%histo%' THEN 'Search_Code' \
-    ELSE 'Extract_Data' \
-    END AS code_ou_data \
+    END as type_interrogation2 \
     FROM statistique_requete as sr LEFT JOIN institution_entity as node \
     ON sr.id_groupe_labo=node.id \
     WHERE {condition_year} AND  nom_groupe_labo NOT IN ('EUROFIDAI','administrateur Drupal') AND  nom_groupe_labo IS NOT NULL AND node.name IS NOT NULL\
@@ -143,140 +175,328 @@ def create_statistique_requete(condition_year: str, type_data: str , condition_l
             WHERE ufd.uid NOT IN (1178,1922,367,274) AND ie.name NOT IN ('EUROFIDAI','administrateur Drupal', 'probesys2 probesys') AND ie.name IS NOT NULL \
              ORDER BY  ie.name, ufd.uid ;"
 
-    df_stats_daily_users = DbConnector('yakari', echo=True).execute_query(req_extraction_stats)
-    df_stats_daily_subscription = DbConnector('yakari', echo=True).execute_query(req_extraction_stats_users)
-    df_stats_users_with_subscription = df_stats_daily_users.merge(df_stats_daily_subscription, how='left', left_on='id_user', right_on='id_user')
-    df_stats_users_with_subscription = df_stats_users_with_subscription[df_stats_users_with_subscription['labo_name'].isnull() == False].drop_duplicates()
-    df_stats_users_with_subscription = df_stats_users_with_subscription.drop(columns=['institution_name'])
-    df_stats_users_with_subscription = df_stats_users_with_subscription.sort_values(by=['labo_name', 'id_user'])
+    db_yakari = DbConnector('yakari', echo=True)
+    if chunksize or aggregate:
+        # the extraction is streamed or aggregated below, only the subscription query is run here
+        df_stats_daily_subscription = db_yakari.execute_query(req_extraction_stats_users)
+        df_stats_daily_users = None
+    else:
+        # the two independent queries run at the same time on two pooled connections
+        results = db_yakari.execute_many_concurrently({'subscription': req_extraction_stats_users, 'stats': (req_extraction_stats, query_params)})
+        df_stats_daily_subscription, df_stats_daily_users = results['subscription'], results['stats']
+    df_stats_daily_subscription = apply_schema(df_stats_daily_subscription, STATS_SUBSCRIPTION_SCHEMA)
 
     df_stats_daily_subscription['date_created'] = pd.to_datetime(df_stats_daily_subscription['date_created'], format='%Y-%m-%d')
     df_stats_daily_subscription['date_create_year'] = df_stats_daily_subscription['date_created'].dt.year
     df_stats_daily_subscription['date_last_access'] = pd.to_datetime(df_stats_daily_subscription['date_last_access'], format='%Y-%m-%d')
     df_stats_daily_subscription['date_last_access_year'] = df_stats_daily_subscription['date_last_access'].dt.year
-
-    df_stats_users_with_subscription['date_created'] = pd.to_datetime(df_stats_users_with_subscription['date_created'], format='%Y-%m-%d')
-    df_stats_users_with_subscription['date_create_year'] = df_stats_users_with_subscription['date_created'].dt.year
-    df_stats_users_with_subscription['date_last_access'] = pd.to_datetime(df_stats_users_with_subscription['date_last_access'], format='%Y-%m-%d')
-    df_stats_users_with_subscription['date_last_access_year'] = df_stats_users_with_subscription['date_last_access'].dt.year
-    df_stats_daily_subscription.to_csv(str(CHEMIN_RESULTAT / "raw_data_stats_daily_subscription.csv"), index=False, encoding='utf-8',  sep='|')
-    df_stats_users_with_subscription.to_csv(str(CHEMIN_RESULTAT / "stats_all_users_with_subscription_informations.csv"), index=False, encoding='utf-8',  sep='|')
-    df_stats_users_with_subscription.to_csv(str(CHEMIN_INPUT_CSV / "stats_all_users_with_subscription_informations.csv"), index=False, encoding='utf-8',  sep='|')
+    write_table(df_stats_daily_subscription, CHEMIN_RESULTAT / "raw_data_stats_daily_subscription", table_format)
 
     # Total number of subscribers per labo
-    df_stats_number_of_all_subscribers_per_labo = df_stats_daily_subscription.groupby(['labo_name','statut']).size().reset_index(name='nb_subscribers')
+    df_stats_number_of_all_subscribers_per_labo = df_stats_daily_subscription.groupby(['labo_name','statut'], observed=True).size().reset_index(name='nb_subscribers')
     df_stats_number_of_all_subscribers_per_labo.sort_values(by=['labo_name','statut'],inplace=True)
-    df_stats_number_of_all_subscribers_per_labo.to_csv(str(CHEMIN_RESULTAT / "stats_number_of_subscribers_per_labo_and_status.csv"), index=False, encoding='utf-8', sep='|')
-    df_stats_number_of_all_subscribers_per_labo.to_csv(str(CHEMIN_INPUT_CSV / "stats_number_of_subscribers_per_labo_and_status.csv"), index=False, encoding='utf-8', sep='|')
+    write_table(df_stats_number_of_all_subscribers_per_labo, CHEMIN_RESULTAT / "stats_number_of_subscribers_per_labo_and_status", table_format, links=[CHEMIN_INPUT_CSV])
     
     # Total number of subscribers per year_created
-    df_stats_number_of_subscribers_created = df_stats_daily_subscription.groupby(['labo_name','statut', 'date_create_year']).size().reset_index(name='nb_subscribers')
+    df_stats_number_of_subscribers_created = df_stats_daily_subscription.groupby(['labo_name','statut', 'date_create_year'], observed=True).size().reset_index(name='nb_subscribers')
     df_stats_number_of_subscribers_created.sort_values(by=['labo_name','date_create_year','statut'],inplace=True)
-    df_stats_number_of_subscribers_created.to_csv(str(CHEMIN_RESULTAT / "stats_number_of_subscribers_per_status_and_year_creation.csv"), index=False, encoding='utf-8', sep='|')
-    df_stats_number_of_subscribers_created.to_csv(str(CHEMIN_INPUT_CSV / "stats_number_of_subscribers_per_status_and_year_creation.csv"), index=False, encoding='utf-8', sep='|')
+    write_table(df_stats_number_of_subscribers_created, CHEMIN_RESULTAT / "stats_number_of_subscribers_per_status_and_year_creation", table_format, links=[CHEMIN_INPUT_CSV])
 
     # Total number of subscribers per year_last_access
-    df_stats_number_of_subscribers_last_access = df_stats_daily_subscription.groupby(['labo_name','statut', 'date_last_access_year']).size().reset_index(name='nb_subscribers')
+    df_stats_number_of_subscribers_last_access = df_stats_daily_subscription.groupby(['labo_name','statut', 'date_last_access_year'], observed=True).size().reset_index(name='nb_subscribers')
     df_stats_number_of_subscribers_last_access.sort_values(by=['labo_name','date_last_access_year','statut'],inplace=True)
-    df_stats_number_of_subscribers_last_access.to_csv(str(CHEMIN_RESULTAT / "stats_number_of_subscribers_per_status_and_year_last_access.csv"), index=False, encoding='utf-8', sep='|') 
-    df_stats_number_of_subscribers_last_access.to_csv(str(CHEMIN_INPUT_CSV / "stats_number_of_subscribers_per_status_and_year_last_access.csv"), index=False, encoding='utf-8', sep='|') 
-    
-
-    df_stats_daily_users['year'] = df_stats_daily_users['year'].astype(int)
-    df_stats_daily_users['month'] = df_stats_daily_users['month'].astype(int)
-    df_stats_daily_users['nb_codes'] = df_stats_daily_users['nb_codes'].astype(int)
-    df_stats_daily_users['yearmonth'] = df_stats_daily_users['year'].astype(str) + df_stats_daily_users['month'].astype(str).str.zfill(2)
+    write_table(df_stats_number_of_subscribers_last_access, CHEMIN_RESULTAT / "stats_number_of_subscribers_per_status_and_year_last_access", table_format, links=[CHEMIN_INPUT_CSV])
     
-    #df_stats_daily_users = df_stats_daily_users[['institution_name','yearmonth','year','month','month2','nb_codes']].groupby(['institution_name','year','yearmonth','month2','month']).sum('nb_codes').reset_index()
-    df_stats_daily_users.sort_values(by=['institution_name','year','month'],inplace=True)
-    
-    # Convert 'year_month' to datetime objects
-    df_stats_daily_users['date'] = pd.to_datetime(df_stats_daily_users['yearmonth'], format='%Y%m')
+    if aggregate:
+        return extract_aggregated_statistique_requete(db_yakari, condition_year, condition_labo, df_stats_daily_subscription, table_format)
 
-    # Extract formatted month names
-    df_stats_daily_users['month_name'] = df_stats_daily_users['date'].dt.strftime('%b%y')  # %b for abbreviated month names (Jan, Feb...)
-    df_stats_daily_users.to_csv(str(CHEMIN_RESULTAT / "raw_data_stats_daily_users.csv"), index=False, encoding='utf-8', sep='|')
+    # With a chunksize the extraction is streamed through a server-side cursor and folded chunk by chunk
+    # into running totals, otherwise it was read at once with the subscription query (a single chunk)
+    if chunksize:
+        chunks = db_yakari.iter_query(req_extraction_stats, chunksize=chunksize, params=query_params)
+    else:
+        chunks = [df_stats_daily_users]
+
+    totals = store['totals'] if store is not None else None
+    watermark = store['watermark'] if store is not None else None
+    # keys of the rows of the overlap window already folded, and of the rows folded by this run
+    recent_keys = store['recent_keys'] if store is not None else pd.DataFrame({'key': pd.Series(dtype='uint64'), 'date_heure_extraction': pd.Series(dtype='datetime64[ns]')})
+    folded_keys = [recent_keys]
+    # with a store, the new rows are appended to the raw data table of the previous runs
+    raw_data_writer = TableWriter(CHEMIN_RESULTAT / "raw_data_stats_daily_users", table_format, append=store is not None)
+    # in streamed mode each chunk is sorted before it is appended, the file is not sorted as a whole
+    subscription_writers = [] if incremental else [TableWriter(CHEMIN_RESULTAT / "stats_all_users_with_subscription_informations", table_format,
+                                                               links=[CHEMIN_INPUT_CSV])]
+    df_stats_users_with_subscription = None
+    for df_stats_daily_users in chunks:
+        if incremental:
+            # the rows of the overlap window folded by the previous run are dropped
+            keys = row_keys(df_stats_daily_users)
+            is_new = ~keys.isin(recent_keys['key'])
+            df_stats_daily_users = df_stats_daily_users[is_new]
+            folded_keys.append(pd.DataFrame({'key': keys[is_new].values, 'date_heure_extraction': df_stats_daily_users['date_heure_extraction'].values}))
+        # compact dtypes right after the fetch, kept through the merge and the aggregations
+        df_stats_daily_users = apply_schema(df_stats_daily_users, STATS_DAILY_USERS_SCHEMA)
+        # database_name2 and code_ou_data of the distinct database names (see utils.DatabaseClassifier)
+        df_stats_daily_users = classify_database_names(df_stats_daily_users)
+        if not incremental:
+            df_stats_users_with_subscription = merge_users_with_subscription(df_stats_daily_users, df_stats_daily_subscription)
+        df_stats_daily_users = prepare_stats_daily_users(df_stats_daily_users)
+        if incremental and not df_stats_daily_users.empty:
+            chunk_watermark = df_stats_daily_users['date_heure_extraction'].max()
+            watermark = chunk_watermark if watermark is None else max(watermark, chunk_watermark)
+
+        for writer in subscription_writers:
+            writer.write(df_stats_users_with_subscription)
+        raw_data_writer.write(df_stats_daily_users)
+
+        totals = fold_stats_daily_users(df_stats_daily_users, totals)
+
+    for writer in [raw_data_writer] + subscription_writers:
+        writer.close()
+
+    if totals is None:
+        # empty streamed result
+        df_stats_users_with_subscription = None
+        df_empty = pd.DataFrame(columns=['id_user','institution_name','user_name','year','month','month2','database_name2','type_interrogation2','nb_codes'])
+        totals = fold_stats_daily_users(prepare_stats_daily_users(apply_schema(df_empty, STATS_DAILY_USERS_SCHEMA)))
+    elif chunksize and not incremental:
+        # streamed rows are only written to disk, they are not kept in memory
+        df_stats_users_with_subscription = None
+
+    if incremental:
+        recent_keys = pd.concat(folded_keys, ignore_index=True)
+        if watermark is not None:
+            recent_keys = recent_keys[recent_keys['date_heure_extraction'] >= pd.Timestamp(watermark) - INCREMENTAL_OVERLAP]
+        save_incremental_store(totals, watermark, recent_keys)
+        # the subscription informations are refreshed for every user of the stored history
+        df_stats_users_with_subscription = merge_users_with_subscription(totals['users'], df_stats_daily_subscription)
+        write_table(df_stats_users_with_subscription, CHEMIN_RESULTAT / "stats_all_users_with_subscription_informations", table_format, links=[CHEMIN_INPUT_CSV])
+        if years is not None:
+            totals = {'cube': totals['cube'].subcube(year=years)}
+
+    # every report is a rollup of the usage cube, the raw rows are not scanned again
+    cube = totals['cube']
 
     #stats for all laboratories
-    df_all_laboratories = df_stats_daily_users[['year','month','month2','date','month_name','nb_codes','institution_name','user_name']].drop_duplicates(subset=['institution_name','user_name','year','month','month2']).groupby(['year','month','month2']).size().reset_index(name='nb_users')
-    df_all_laboratories.sort_values(by=['month'],inplace=True)
+    df_all_laboratories = cube.rollup(['year','month'])
+    df_all_laboratories['month2'] = df_all_laboratories['month'].map(MONTH_NAMES)
+    df_all_laboratories = df_all_laboratories[['year','month','month2','nb_users']].sort_values(by=['month'])
     
     # stats per laboratory
-    df_per_laboratory = df_stats_daily_users[['institution_name','year','month','month2','date','month_name','nb_codes']].groupby(['institution_name','year','month2','month','date','month_name']).sum('nb_codes').reset_index()
-    df_per_laboratory.sort_values(by=['institution_name','year','month'],inplace=True)
+    df_per_laboratory = cube.rollup(['institution_name','year','month'])
+    df_per_laboratory['month2'] = df_per_laboratory['month'].map(MONTH_NAMES)
+    df_per_laboratory['date'] = month_start_date(df_per_laboratory)
+    df_per_laboratory['month_name'] = df_per_laboratory['date'].dt.strftime('%b%y')
+    df_per_laboratory = df_per_laboratory[['institution_name','year','month2','month','date','month_name','nb_codes']].sort_values(by=['institution_name','year','month'])
     
     # stats per user
-    df_all_users = df_stats_daily_users[['institution_name','year','month','month2','date','user_name','month_name','nb_codes']].drop_duplicates(subset=['institution_name','user_name', 'year','month','month2']).groupby(['institution_name','year','month','month2']).size().reset_index(name='nb_users')
-    df_all_users.sort_values(by=['institution_name','year','month'],inplace=True)     
+    df_all_users = cube.rollup(['institution_name','year','month'])
+    df_all_users['month2'] = df_all_users['month'].map(MONTH_NAMES)
+    df_all_users = df_all_users[['institution_name','year','month','month2','nb_users']].sort_values(by=['institution_name','year','month'])
 
     # stats per database
-    df_all_db = df_stats_daily_users[['institution_name','database_name2','year','month','month2','date','month_name','nb_codes']].groupby(['institution_name','database_name2','year']).sum('nb_codes').reset_index()
-    df_all_db.sort_values(by=['institution_name','database_name2','year'],inplace=True) 
+    df_all_db = cube.rollup(['institution_name','database_name2','year'])
+    df_all_db = df_all_db[['institution_name','database_name2','year','nb_codes']].sort_values(by=['institution_name','database_name2','year'])
   
-    
-    if type_data == 'laboratory':
-        return df_per_laboratory
-    elif type_data == 'user':
-        return df_all_users
-    elif type_data == 'database':
-        return df_all_db
-    elif type_data == 'all':
-        return df_all_laboratories
-    else:
-        return None
+    return {'all': df_all_laboratories,
+            'laboratory': df_per_laboratory,
+            'user': df_all_users,
+            'database': df_all_db,
+            'subscription': df_stats_daily_subscription,
+            'users_with_subscription': df_stats_users_with_subscription}
 
 
-def create_graph(df: pd.DataFrame, labo_name: str, year: int, x_var: str, y_var: str, color: str , legend_title: str=None, \
-                  xlabel: str = None, ylabel: str = None, title: str = None,  save: bool = False, **kwargs):            
-
-    def get_yaxis_width(ax):  # Changed to y-axis width
-        width = 0
-        axes = [ax] + ax.child_axes
-        for ax in axes:
-            width += ax.yaxis.get_tightbbox().width  # y-axis width
-            width += ax.yaxis.get_tick_params()['pad']
-        return width * 72 / fig.dpi
+def month_start_date(df: pd.DataFrame) -> pd.Series:
+    """ Return the first day of the month built from the 'year' and 'month' columns. """
+    yearmonth = df['year'].astype(str) + df['month'].astype(str).str.zfill(2)
+    return pd.to_datetime(yearmonth, format='%Y%m')
+
+
+def merge_users_with_subscription(df_stats_daily_users: pd.DataFrame, df_stats_daily_subscription: pd.DataFrame) -> pd.DataFrame:
+    """ Merge the raw extraction rows with the subscription informations of their user. """
+    df_stats_users_with_subscription = df_stats_daily_users.merge(df_stats_daily_subscription, how='left', left_on='id_user', right_on='id_user')
+    df_stats_users_with_subscription = df_stats_users_with_subscription[df_stats_users_with_subscription['labo_name'].isnull() == False].drop_duplicates()
+    df_stats_users_with_subscription = df_stats_users_with_subscription.drop(columns=['institution_name'])
+    df_stats_users_with_subscription = df_stats_users_with_subscription.sort_values(by=['labo_name', 'id_user'])
+
+    df_stats_users_with_subscription['date_created'] = pd.to_datetime(df_stats_users_with_subscription['date_created'], format='%Y-%m-%d')
+    df_stats_users_with_subscription['date_create_year'] = df_stats_users_with_subscription['date_created'].dt.year
+    df_stats_users_with_subscription['date_last_access'] = pd.to_datetime(df_stats_users_with_subscription['date_last_access'], format='%Y-%m-%d')
+    df_stats_users_with_subscription['date_last_access_year'] = df_stats_users_with_subscription['date_last_access'].dt.year
+    return df_stats_users_with_subscription
+
+
+def prepare_stats_daily_users(df_stats_daily_users: pd.DataFrame) -> pd.DataFrame:
+    """ Add the yearmonth, date and month_name columns to the raw extraction rows (cast with STATS_DAILY_USERS_SCHEMA). """
+    df_stats_daily_users['yearmonth'] = df_stats_daily_users['year'].astype(str) + df_stats_daily_users['month'].astype(str).str.zfill(2)
     
+    df_stats_daily_users.sort_values(by=['institution_name','year','month'],inplace=True)
     
-    fig, ax = plt.subplots(figsize=(12, 8))
-    plt.style.use('seaborn-v0_8-dark-palette')
-    plt.rc('font', size=12, family='Arial', weight='normal')  # Set font properties
-    ax.spines[['bottom', 'top', 'right']].set_visible(True)  # Hide spines    
-    bc = ax.bar(df[x_var], df[y_var], color=color ) # barh for horizontal   
-    ax.tick_params(axis='x', rotation=70, labelsize=10)  # Rotate x-axis labels 
+    # Convert 'year_month' to datetime objects
+    df_stats_daily_users['date'] = pd.to_datetime(df_stats_daily_users['yearmonth'], format='%Y%m')
 
-    ax.bar_label(bc, labels=df[y_var], padding=30, fmt='%s', fontsize=10)  # fmt='%s' for string labels
-    
-    # Add custom legend if needed
-    ax.legend(title=legend_title, loc='upper right', labels=[f"{year}"])
-    ax.set_xlabel(xlabel, fontsize=14, loc='center', fontweight='bold')
-    ax.set_ylabel(ylabel, fontsize=14, loc='center', fontweight='bold')
-    ax.set_title(f"{labo_name}({year})", fontsize=20, fontweight='bold', \
-                backgroundcolor='lightgrey', loc='center', pad=15)
+    # Extract formatted month names
+    df_stats_daily_users['month_name'] = df_stats_daily_users['date'].dt.strftime('%b%y').astype('category')  # %b for abbreviated month names (Jan, Feb...)
+    return df_stats_daily_users
 
-    from matplotlib.ticker import MultipleLocator
-    max_value = df[y_var].max()
-    if max_value <= 100 :   # Set x-axis limits
-        ax.set_ylim(0, max_value + 10) 
-    elif max_value <= 50000:
-        ax.set_ylim(0, max_value + max_value*0.5) 
-    elif max_value > 50000:
-        ax.set_ylim(0, max_value + max_value*0.35)
-       
-    multiple = get_multiple_locator(max_value)
-    ax.yaxis.set_major_locator(MultipleLocator(multiple))  # Keep x-axis ticks as multiples of 5 for horizontal
-    
-    plt.tight_layout()  # Adjust subplot parameters to give specified padding
+
+def fold_stats_daily_users(df_stats_daily_users: pd.DataFrame, totals: dict = None) -> dict:
+    """
+    Fold a chunk of prepared extraction rows into the running totals:
+    - 'cube': the usage cube (institution, user, database_name2, type_interrogation2, year, month) of the rows
+    - 'users': distinct (id_user, user_name, institution) rows
+    Returns the updated totals (the totals of the chunk alone if totals is None).
+    """
+    chunk_totals = {
+        'cube': UsageCube(df_stats_daily_users, user_dimensions=['institution_name','user_name']),
+        'users': df_stats_daily_users[['id_user','user_name','institution_name']].drop_duplicates(),
+    }
+    if totals is None:
+        return chunk_totals
+
+    return {
+        'cube': totals['cube'].merge(chunk_totals['cube']),
+        'users': pd.concat([totals['users'], chunk_totals['users']]).drop_duplicates(),
+    }
+
+
+def row_keys(df_stats_daily_users: pd.DataFrame) -> pd.Series:
+    """ Return the 64-bit hash of the ROW_KEY_COLUMNS of each row (ids and counters hashed as integers, so the key
+    does not depend on the int or float dtype of the chunk). """
+    df_keys = df_stats_daily_users[ROW_KEY_COLUMNS].astype({col: 'Int64' for col in ['id_user','id_labo','type_interrogation','nb_codes']})
+    return pd.util.hash_pandas_object(df_keys, index=False)
+
+
+def load_incremental_store() -> dict:
+    """
+    Load the incremental store: {'watermark': the last date_heure_extraction already folded,
+    'recent_keys': the keys (row_keys) and dates of the rows folded within INCREMENTAL_OVERLAP of the watermark,
+    'totals': the running totals of fold_stats_daily_users}. Returns None if there is no store yet.
+    """
+    if not INCREMENTAL_STORE.exists():
+        return None
+    store = pd.read_pickle(INCREMENTAL_STORE)
+    if 'cube' not in store['totals'] or 'recent_keys' not in store:
+        # store of the former totals layout, the history is extracted again
+        print(f"Incremental store {INCREMENTAL_STORE} has an old layout, it is rebuilt")
+        return None
+    return store
+
+
+def save_incremental_store(totals: dict, watermark, recent_keys: pd.DataFrame) -> None:
+    """ Save the running totals, the watermark and the keys of the overlap window for the next incremental run. """
+    CHEMIN_STORE.mkdir(parents=True, exist_ok=True)
+    pd.to_pickle({'watermark': watermark, 'recent_keys': recent_keys, 'totals': totals}, INCREMENTAL_STORE)
+    print(f"Incremental store saved (watermark: {watermark})")
+
+
+def extract_aggregated_statistique_requete(db_yakari: DbConnector, condition_year: str, condition_labo: str,
+                                           df_stats_daily_subscription: pd.DataFrame, table_format: str = 'csv') -> dict:
+    """
+    This function runs the GROUP BY / COUNT(DISTINCT user) aggregations in PostgreSQL, so only the small
+    result tables are fetched instead of every statistique_requete row.
+    Returns the same dict as extract_statistique_requete.
+    """
+    # same rows as the raw extraction (distinct on the source columns), without the display columns
+    req_extraction = f"SELECT distinct id_utilisateur_drupal as id_user, nom_utilisateur as user_name, id_groupe_labo as id_labo, node.name as institution_name, \
+    date_part('year',date_heure_extraction)::int as year, date_part('month',date_heure_extraction)::int as month, nom_base_interrogee as database_name, \
+    type_interrogation, nb_codes_en_entree as nb_codes, date_heure_extraction \
+    FROM statistique_requete as sr LEFT JOIN institution_entity as node \
+    ON sr.id_groupe_labo=node.id \
+    WHERE {condition_year} AND  nom_groupe_labo NOT IN ('EUROFIDAI','administrateur Drupal') AND  nom_groupe_labo IS NOT NULL AND node.name IS NOT NULL\
+    AND id_utilisateur_drupal NOT IN (1178,1922,367,274,594,896,904) {condition_labo}"
+
+    # every result table is a grouping set of a single query, so statistique_requete is scanned once
+    # nb_users counts the distinct (institution, user) pairs, a missing user name counting as one user
+    req_aggregates = f"WITH extraction AS ({req_extraction}) \
+    SELECT GROUPING(institution_name, database_name, month, id_user) as grouping_set, \
+    institution_name, database_name, year, month, id_user, user_name, \
+    sum(nb_codes)::bigint as nb_codes, count(DISTINCT (institution_name, user_name)) as nb_users \
+    FROM extraction \
+    GROUP BY GROUPING SETS ((year, month), (institution_name, year, month), (institution_name, database_name, year), \
+    (id_user, user_name, institution_name));"
+
+    df_aggregates = db_yakari.execute_query(req_aggregates)
+    # GROUPING() bit set for each column of (institution_name, database_name, month, id_user) which is not grouped
+    aggregate_sets = {'all': 0b1101, 'laboratory': 0b0101, 'database': 0b0011, 'users': 0b0110}
+    aggregates = {name: df_aggregates[df_aggregates['grouping_set'] == grouping_set].reset_index(drop=True)
+                  for name, grouping_set in aggregate_sets.items()}
+    # the keys are floats in the result (NULL outside of their grouping sets)
+    for name, columns in {'all': ['year','month'], 'laboratory': ['year','month'], 'database': ['year'], 'users': ['id_user']}.items():
+        aggregates[name] = aggregates[name].astype({col: int for col in columns})
+
+    #stats for all laboratories
+    df_all_laboratories = aggregates['all'][['year','month','nb_users']].copy()
+    df_all_laboratories['month2'] = df_all_laboratories['month'].map(MONTH_NAMES)
+    df_all_laboratories = df_all_laboratories[['year','month','month2','nb_users']].sort_values(by=['month','year'])
+
+    # stats per laboratory
+    df_per_laboratory = aggregates['laboratory'][['institution_name','year','month','nb_codes']].copy()
+    df_per_laboratory['month2'] = df_per_laboratory['month'].map(MONTH_NAMES)
+    df_per_laboratory['date'] = month_start_date(df_per_laboratory)
+    df_per_laboratory['month_name'] = df_per_laboratory['date'].dt.strftime('%b%y')
+    df_per_laboratory = df_per_laboratory[['institution_name','year','month2','month','date','month_name','nb_codes']].sort_values(by=['institution_name','year','month'])
+
+    # stats per user (same grouping set as the stats per laboratory)
+    df_all_users = aggregates['laboratory'][['institution_name','year','month','nb_users']].copy()
+    df_all_users['month2'] = df_all_users['month'].map(MONTH_NAMES)
+    df_all_users = df_all_users[['institution_name','year','month','month2','nb_users']].sort_values(by=['institution_name','year','month'])
+
+    # stats per database, grouped by the raw database name and classified into database_name2 (see utils.DatabaseClassifier)
+    df_all_db = aggregates['database'][['institution_name','database_name','year','nb_codes']].copy()
+    df_all_db['database_name2'] = DATABASE_NAME2_CLASSIFIER.classify_series(df_all_db['database_name'])
+    df_all_db = df_all_db.groupby(['institution_name','database_name2','year'], observed=True)['nb_codes'].sum().reset_index()
+    df_all_db.sort_values(by=['institution_name','database_name2','year'],inplace=True)
+
+    # users of the extraction with their subscription informations (columns used by the PPTX stage)
+    df_users = aggregates['users'][['id_user','user_name','institution_name']]
+    df_stats_users_with_subscription = merge_users_with_subscription(df_users, df_stats_daily_subscription)
+    write_table(df_stats_users_with_subscription, CHEMIN_RESULTAT / "stats_all_users_with_subscription_informations", table_format, links=[CHEMIN_INPUT_CSV])
+
+    return {'all': df_all_laboratories,
+            'laboratory': df_per_laboratory,
+            'user': df_all_users,
+            'database': df_all_db,
+            'subscription': df_stats_daily_subscription,
+            'users_with_subscription': df_stats_users_with_subscription}
+
+
+def create_statistique_requete(condition_year: str, type_data: str , condition_labo: str = "", stats: dict = None) -> pd.DataFrame:
+    """
+    This function returns the dataframe for daily users database depending on the type of data requested (all, laboratory, user, database).
+    If stats (the result of extract_statistique_requete) is given, no query is run and the dataframe is selected from it.
+    """
+    if stats is None:
+        stats = extract_statistique_requete(condition_year, condition_labo)
+    return stats.get(type_data)
+
+
+def create_graph(df: pd.DataFrame, labo_name: str, year: int, x_var: str, y_var: str, color: str , legend_title: str=None, \
+                  xlabel: str = None, ylabel: str = None, title: str = None,  save: bool = False, render_cache: bool = True, **kwargs):            
+    """ This function draws a bar graph for a specific laboratory and year with the shared renderer of the process
+    (one reused figure, closed at the end of the run by close_bar_renderer).
+    With render_cache, a saved graph is not drawn again if its data and parameters did not change. """
     CHEMIN_LABO = Path(CHEMIN_RESULTAT, labo_name)
+    path = None
     if save:
+        path = CHEMIN_LABO/f"{title}.png"
+        digest = chart_digest(df[[x_var, y_var]], labo_name=labo_name, year=year, x_var=x_var, y_var=y_var, color=color,
+                              legend_title=legend_title, xlabel=xlabel, ylabel=ylabel)
+        if render_cache and chart_is_cached(path, digest):
+            print(f"Unchanged, not drawn again ...: {title}")
+            return
         print(f"Saving filename ...: {title}")
-        plt.savefig(str(CHEMIN_LABO/f"{title}.png"), bbox_inches='tight')  # Ensure all elements are included
-    plt.show()
+    get_bar_renderer().bar_chart(df, x_var=x_var, y_var=y_var, color=color, title=f"{labo_name}({year})", legend_title=legend_title,
+                                 legend_label=f"{year}", xlabel=xlabel, ylabel=ylabel, path=path)
+    if save:
+        save_chart_digest(path, digest)
 
 
-def create_seaborn_relplot(df: pd.DataFrame, x_var: str, y_var: str, kind: str = "scatter", palette: str = None, height: int = 5, aspect: float = 1.5, title: str = None, hue: str = None, legend_labels: list = None, legend_title: str=None, save: bool = False, filename: str=None, **kwargs):
+def create_seaborn_relplot(df: pd.DataFrame, x_var: str, y_var: str, kind: str = "scatter", palette: str = None, height: int = 5, aspect: float = 1.5, title: str = None, hue: str = None, legend_labels: list = None, legend_title: str=None, save: bool = False, filename: str=None, render_cache: bool = True, **kwargs):
     """
     Creates a flexible relplot with nested x-axis variables and customizable aesthetics.
+    With render_cache, a saved plot is not drawn again if its data and parameters did not change.
 
     Args:
         df: The Pandas DataFrame containing the data.
@@ -290,7 +510,15 @@ def create_seaborn_relplot(df: pd.DataFrame, x_var: str, y_var: str, kind: str =
         legend_title: The title for the legend
         **kwargs: Additional keyword arguments to pass to `sns.catplot`.
     """
-    
+    if save:
+        path = CHEMIN_RESULTAT / f"{filename}.png"
+        columns = list(dict.fromkeys(col for col in [x_var, y_var, hue] if col is not None))
+        digest = chart_digest(df[columns], x_var=x_var, y_var=y_var, kind=kind, palette=palette, height=height, aspect=aspect,
+                              title=title, hue=hue, legend_labels=legend_labels, legend_title=legend_title, kwargs=kwargs)
+        if render_cache and chart_is_cached(path, digest):
+            print(f"Unchanged, not drawn again ...: {filename}")
+            return
+
     g = sns.relplot(
         x=x_var,
         y=y_var,
@@ -324,11 +552,13 @@ def create_seaborn_relplot(df: pd.DataFrame, x_var: str, y_var: str, kind: str =
 
     if save:
         print(f"Saving filename ...: {filename}")
-        plt.savefig(str(CHEMIN_RESULTAT / f"{filename}.png"))
-    plt.show()
+        plt.savefig(str(path))
+        save_chart_digest(path, digest)
+    plt.close(g.figure)
 
 
-def create_and_save_graph(df_labo: pd.DataFrame, df_user: pd.DataFrame, df_db: pd.DataFrame, years: int, labo: str):  
+def create_and_save_graph(df_labo: pd.DataFrame, df_user: pd.DataFrame, df_db: pd.DataFrame, years: int, labo: str, n_jobs: int = 1,
+                          render_cache: bool = True):  
 
     """This function creates and saves graphs for a specific laboratory and year(s).
        It generates three types of graphs: 
@@ -342,56 +572,84 @@ def create_and_save_graph(df_labo: pd.DataFrame, df_user: pd.DataFrame, df_db: p
     #   df_db (pd.DataFrame): DataFrame containing database data.
     #   years (int or list): Year or list of years for which to create graphs.
     #   labo (str): Name of the laboratory for which to create graphs.
+    #   n_jobs (int): Number of worker processes used to render the graphs (1 renders them in this process).
+    #   render_cache (bool): Skip the graphs whose data did not change since they were saved.
     # Returns:
     #   None
     """
+    render_graph_jobs(create_graph_jobs(df_labo, df_user, df_db, years, labo, render_cache), n_jobs=n_jobs)
+
 
-    if isinstance(years, int): 
+def create_graph_jobs(df_labo: pd.DataFrame, df_user: pd.DataFrame, df_db: pd.DataFrame, years: int, labo: str, render_cache: bool = True) -> list:
+    """ Build the (institution, year, chart kind) jobs of create_and_save_graph.
+    Each job only holds the two plotted columns of its slice, so it is cheap to send to a worker process."""
+    if isinstance(years, int):
+        years = [years]
+
+    jobs = []
+    for year in years:
         # graphics Laboratories 
-        df_labo_year =  df_labo[(df_labo['institution_name'] == labo) & (df_labo['year'] == int(years))]
-        if not df_labo_year.empty:               
-            create_graph(df_labo_year, labo_name=labo, year=years, x_var='month2', y_var='nb_codes', \
-            color='lightsteelblue', legend_title ="Number of extracted Eurofidai codes", xlabel="Month", ylabel ="Number of codes" , title=f'{labo}_{years}', save=True)          
+        df_labo_year = df_labo[(df_labo['institution_name'] == labo) & (df_labo['year'] == int(year))]
+        if not df_labo_year.empty:
+            jobs.append({'df': df_labo_year[['month2', 'nb_codes']], 'labo_name': labo, 'year': year, 'x_var': 'month2', 'y_var': 'nb_codes',
+                         'color': 'lightsteelblue', 'legend_title': "Number of extracted Eurofidai codes", 'xlabel': "Month", 'ylabel': "Number of codes",
+                         'title': f'{labo}_{year}', 'save': True, 'render_cache': render_cache})
+
         # graphics Users
-        df_user_year = df_user[(df_user['year'] == years) & (df_user["institution_name"] == labo)]
-        if not df_user_year.empty:           
-            create_graph(df_user_year, labo_name=labo, year=years, x_var='month2', y_var='nb_users', \
-            color='darkred', legend_title ="Number of users", xlabel="Month", ylabel ="Number of users" , title=f'{labo}_users_{years}', save=True)          
-        
+        df_user_year = df_user[(df_user['year'] == int(year)) & (df_user["institution_name"] == labo)]
+        if not df_user_year.empty:
+            jobs.append({'df': df_user_year[['month2', 'nb_users']], 'labo_name': labo, 'year': year, 'x_var': 'month2', 'y_var': 'nb_users',
+                         'color': 'darkred', 'legend_title': "Number of users", 'xlabel': "Month", 'ylabel': "Number of users",
+                         'title': f'{labo}_users_{year}', 'save': True, 'render_cache': render_cache})
+
         # graphics Databases
-        df_db_year = df_db[(df_db['year'] == years) & (df_db["institution_name"] == labo)]
+        df_db_year = df_db[(df_db['year'] == int(year)) & (df_db["institution_name"] == labo)]
         if not df_db_year.empty:
-                create_graph(df_db_year, labo_name=labo, year=years, x_var='database_name2', y_var='nb_codes', \
-            color='deeppink', legend_title ="Number of extracted Eurofidai codes", xlabel="Database", ylabel ="Number of codes" , title=f'{labo}_database_{years}', save=True)   
-        
-    elif isinstance(years, list):
-        # graphics Laboratories 
-        for year in years:
-            df_labo_year =  df_labo[(df_labo['institution_name'] == labo) & (df_labo['year'] == int(year))]                    
-            if not df_labo_year.empty:              
-                create_graph( df_labo_year, labo_name=labo, year=year, x_var='month2', y_var='nb_codes', \
-            color='lightsteelblue', legend_title ="Number of extracted Eurofidai codes", xlabel="Month", ylabel ="Number of codes" , title=f'{labo}_{year}', save=True)                   
-            
-            # graphics Users
-            df_user_year = df_user[(df_user['year'] == int(year)) & (df_user["institution_name"] == labo)]
-            if not df_user_year.empty:           
-                create_graph(df_user_year, labo_name=labo, year=year, x_var='month2', y_var='nb_users', \
-                color='darkred', legend_title ="Number of users", xlabel="Month", ylabel ="Number of users" , title=f'{labo}_users_{year}', save=True) 
-
-            # graphics Databases
-            df_db_year = df_db[(df_db['year'] == int(year)) & (df_db["institution_name"] == labo)]
-            #print(df_db_year.head(20))
-            if not df_db_year.empty:
-                create_graph( df_db_year, labo_name=labo, year=year, x_var='database_name2', y_var='nb_codes', \
-            color='deeppink', legend_title ="Number of extracted Eurofidai codes", xlabel="Database", ylabel ="Number of codes" , title=f'{labo}_database_{year}', save=True)                   
-            
+            jobs.append({'df': df_db_year[['database_name2', 'nb_codes']], 'labo_name': labo, 'year': year, 'x_var': 'database_name2', 'y_var': 'nb_codes',
+                         'color': 'deeppink', 'legend_title': "Number of extracted Eurofidai codes", 'xlabel': "Database", 'ylabel': "Number of codes",
+                         'title': f'{labo}_database_{year}', 'save': True, 'render_cache': render_cache})
+    return jobs
 
-    
-def extract_data(folder_path, institution_list):
 
+def render_graph_job(job: dict) -> str:
+    """ Render one job of create_graph_jobs and return its title. """
+    params = dict(job)
+    df = params.pop('df')
+    create_graph(df, **params)
+    return params['title']
+
+
+def init_graph_worker():
+    """ Worker processes render with the non-interactive Agg backend. """
+    import matplotlib
+    # drop the renderer inherited from the parent process, the worker creates its own
+    close_bar_renderer()
+    matplotlib.use('Agg')
+
+
+def render_graph_jobs(jobs: list, n_jobs: int = 1) -> None:
+    """ Render the graph jobs one after another, or in a pool of n_jobs worker processes (0 = one per core). """
+    if n_jobs == 0:
+        n_jobs = os.cpu_count()
+    if n_jobs is None or n_jobs <= 1 or len(jobs) <= 1:
+        for job in jobs:
+            render_graph_job(job)
+        return
+
+    with ProcessPoolExecutor(max_workers=n_jobs, initializer=init_graph_worker) as executor:
+        # list() waits for every job and raises the first error of a worker
+        titles = list(executor.map(render_graph_job, jobs))
+    print(f"{len(titles)} graphs rendered with {n_jobs} processes")
+
+
+def extract_data(folder_path, institution_list, table_format: str = 'csv'):
+    """ Read each stats table of folder_path (files in table_format) once and split its rows between the institutions of institution_list.
+    Returns a dict {normalized institution: [{"file", "columns", "data"}, ...]} for all the institutions found. """
+
+    # columns read from each table (keyed by table name, the other tables are read entirely)
     select_csv_columns = {        
-        #'raw_data_stats_daily_subscription.csv': ['id_user', 'labo_name', 'statut', 'date_create_year', 'date_last_access_year'],  # type: ignore
-        'stats_all_users_with_subscription_informations.csv': ['id_user', 'user_name', 'labo_name', 'statut', 'date_last_access', 'date_created'] # type: ignore
+        #'raw_data_stats_daily_subscription': ['id_user', 'labo_name', 'statut', 'date_create_year', 'date_last_access_year'],  # type: ignore
+        'stats_all_users_with_subscription_informations': ['id_user', 'user_name', 'labo_name', 'statut', 'date_last_access', 'date_created'] # type: ignore
         }
     
 
@@ -399,75 +657,78 @@ def extract_data(folder_path, institution_list):
     #crée un dictionnaire institutionnel
     institution_data = {}
 
-    for file in os.listdir(folder_path):
-        if file.endswith(".csv"):
-            try:
-                #reads csv files and formats to ensure path works across many operating systems
-                #lit les fichiers et formats CSV pour garantir que le chemin fonctionne sur de nombreux systèmes d'exploitation
-                df = pd.read_csv(os.path.join(folder_path, file), delimiter = "|")
-                
-                
-                # Normalizes institution names to handle case insensitivity and unnecessary characters
-                normalized_institution_list = []
-                normalized_institution_list = [normalize(inst) for inst in institution_list]
-                
-                #creates new institution list that ignores capitalization and unnecessary characters
-                #crée une nouvelle liste d'institutions qui ignore les majuscules et les caractères inutiles
-                institution_list = normalized_institution_list
-
-                #finds if any part of each row contains an institution
-                #détermine si une partie de chaque ligne contient une institution
-                match_institution = df.apply(lambda row: any(any(normalized_name in normalize(cell)for normalized_name in normalized_institution_list)for cell in row),axis=1)
-
-                #filters dataframe to include only rows where match_institution is True
-                #filtre le dataframe pour inclure uniquement les lignes où match_institution est True
-                if not match_institution.any():
+    # Normalizes institution names to handle case insensitivity and unnecessary characters
+    #creates new institution list that ignores capitalization and unnecessary characters
+    #crée une nouvelle liste d'institutions qui ignore les majuscules et les caractères inutiles
+    institution_list = list(dict.fromkeys(normalize(inst) for inst in institution_list))
+
+    for file in list_tables(folder_path, table_format):
+        try:
+            #reads the tables with column projection, formats path to ensure it works across many operating systems
+            #lit les tables (seulement les colonnes utiles), formate le chemin pour qu'il fonctionne sur de nombreux systèmes d'exploitation
+            table_name = Path(file).stem
+            df = read_table(Path(folder_path, file), columns=select_csv_columns.get(table_name))
+
+            #finds the rows of each institution with a vectorized search in the label columns (labo_name, institution_name)
+            #détermine les lignes de chaque institution par une recherche vectorisée dans les colonnes de libellés
+            institution_masks = match_institutions(df, institution_list)
+
+            #skip the file if no row contains an institution
+            #ignorer le fichier si aucune ligne ne contient d'institution
+            if not institution_masks:
+                continue
+
+            for institution in institution_list:
+                #skip institution if not in file
+                #ignorer l'établissement s'il n'est pas dans le fichier
+                if institution not in institution_masks:
                     continue
-                filtered_df = df[match_institution]
+
+                #filters only the rows that contain the current institution
+                #filtre uniquement les lignes qui contiennent l'institution actuelle
+                institution_rows = df[institution_masks[institution]]
 
                 # If custom columns are defined for this file, use only those columns (if they exist in the DataFrame)
-                if file in select_csv_columns:
-                    columns_to_keep = [col for col in select_csv_columns[file] if col in filtered_df.columns]
-                    filtered_df = filtered_df[columns_to_keep]
-                    filtered_df.drop_duplicates(inplace=True)
-                    filtered_df.reset_index(drop=True, inplace=True)
-
-                for institution in institution_list:
-                    #filters only the rows that contain the current institution
-                    #filtre uniquement les lignes qui contiennent l'institution actuelle
-                    institution_rows = filtered_df[filtered_df.apply(lambda row: any(institution in normalize(str(cell)) for cell in row), axis=1)].copy()
-
-                    # Attempt to convert year-like float values to integers (e.g., 2022.0 -> 2022)
-                    # Essaie de convertir les valeurs de type float en années en entiers (par exemple, 2022.0 -> 2022)
-                    for col in institution_rows.columns:
-                        if institution_rows[col].dtype == 'float64':
-                            # Only convert if all values are integers in float form
-                            if institution_rows[col].dropna().apply(float.is_integer).all():
-                                institution_rows[col] = institution_rows[col].astype('Int64')
-
-                    #skip institution if not in file
-                    #ignorer l'établissement s'il n'est pas dans le fichier
-                    if not institution_rows.empty:
-                        
-                        #creates new list to store this institutions data if it does not alredy exist in institution_data dictionary
-                        #crée une nouvelle liste pour stocker les données de cette institution si elles n'existent pas déjà dans le dictionnaire de données de l'institution
-                        if institution not in institution_data:
-                            institution_data[institution] = []
-        
-                        institution_data[institution].append({
-                            "file": file,
-                            "columns": institution_rows.columns.tolist(),
-                            "data": institution_rows
-                        })
-
-                        # drop duplicates and reset index for the last entry in the institution_data list
-                        # This ensures that each institution's data is unique and properly indexed  
-                        institution_data[institution][-1]["data"].drop_duplicates(inplace=True)
-                        institution_data[institution][-1]["data"].reset_index(drop=True, inplace=True)
-
-            except Exception as e:
-                # Handle exceptions for individual files, but continue processing others        
-                print(f"Error processing {file}: {e}")
+                if table_name in select_csv_columns:
+                    columns_to_keep = [col for col in select_csv_columns[table_name] if col in institution_rows.columns]
+                    institution_rows = institution_rows[columns_to_keep]
+                institution_rows = institution_rows.copy()
+
+                # typed formats keep the dates as timestamps, they are shown as dates like in the CSV files
+                for col in institution_rows.select_dtypes(include='datetime').columns:
+                    institution_rows[col] = institution_rows[col].dt.date
+
+                # CSV only: attempt to convert year-like float values to integers (e.g., 2022.0 -> 2022)
+                # CSV seulement : essaie de convertir les valeurs de type float en années en entiers (par exemple, 2022.0 -> 2022)
+                for col in institution_rows.columns:
+                    if institution_rows[col].dtype == 'float64':
+                        # Only convert if all values are integers in float form
+                        if institution_rows[col].dropna().apply(float.is_integer).all():
+                            institution_rows[col] = institution_rows[col].astype('Int64')
+
+                #skip institution if not in file
+                #ignorer l'établissement s'il n'est pas dans le fichier
+                if not institution_rows.empty:
+                    
+                    #creates new list to store this institutions data if it does not alredy exist in institution_data dictionary
+                    #crée une nouvelle liste pour stocker les données de cette institution si elles n'existent pas déjà dans le dictionnaire de données de l'institution
+                    if institution not in institution_data:
+                        institution_data[institution] = []
+    
+                    institution_data[institution].append({
+                        "file": file,
+                        "columns": institution_rows.columns.tolist(),
+                        "data": institution_rows
+                    })
+
+                    # drop duplicates and reset index for the last entry in the institution_data list
+                    # This ensures that each institution's data is unique and properly indexed  
+                    institution_data[institution][-1]["data"].drop_duplicates(inplace=True)
+                    institution_data[institution][-1]["data"].reset_index(drop=True, inplace=True)
+
+        except Exception as e:
+            # Handle exceptions for individual files, but continue processing others        
+            print(f"Error processing {file}: {e}")
     return institution_data
 
 def chunk_data_rows(rows, chunk_size):
@@ -475,59 +736,119 @@ def chunk_data_rows(rows, chunk_size):
     for i in range(0, len(rows), chunk_size):
         yield rows[i:i + chunk_size]
 
-def create_institutional_pptx(institution_data, presentation, max_rows_per_slide=10):
-    replace_existing = True  # or False based on user input
-
-    if replace_existing or not os.path.exists(presentation):
-        prs = Presentation()  # start fresh
-    else:
-        prs = Presentation(presentation)  # load and append
-
+def pptx_slide_chunks(institution_data, max_rows_per_slide=10) -> list:
+    """ Return the content of every slide of the deck: {'institution', 'file', 'columns', 'rows', 'index', 'count'},
+    rows being the values of at most max_rows_per_slide rows as strings. """
+    chunks = []
     for institution, blocks in institution_data.items():
         for data in blocks:
-            full_rows = data["data"].to_dict(orient="records")
+            full_rows = [[str(value) for value in row] for row in data["data"][data["columns"]].itertuples(index=False, name=None)]
             row_chunks = list(chunk_data_rows(full_rows, max_rows_per_slide))
-            
             for idx, chunk in enumerate(row_chunks):
-                slide = prs.slides.add_slide(prs.slide_layouts[1])
-                title_shape = slide.shapes.title
-                # define the text title policy
-                
-                slide.shapes.title.text = f"{institution} ({idx + 1}/{len(row_chunks)})"
-                title_font = title_shape.text_frame.paragraphs[0].font
-                title_font.name = 'Calibri'
-                title_font.size = Pt(24)
-                title_font.bold = True
-                textbox = slide.placeholders[1]               
-                tf = textbox.text_frame               
-                tf.clear()
-
-                # File name header
-                p = tf.paragraphs[0]
-                p.text = f"{data['file']}"
-                p.font.bold = True
-                p.font.size = Pt(16)
-                p.font.name = 'Bodoni MT Condensed'
-
-                # Column headers
-                header_p = tf.add_paragraph()
-                header_p.text = " | ".join(data["columns"])
-                header_p.font.bold = True
-                header_p.font.size = Pt(12)
-                header_p.font.name = 'Bodoni MT Condensed'
-                header_p.level = 1
-
-                # Add each row as values only, with statut if file is 'raw_data_stats_daily_users.csv'
-                for row_data in chunk:
-                    values = " | ".join([str(row_data[col]) for col in data["columns"]])
-                    p = tf.add_paragraph()
-                    p.text = values
-                    p.font.size = Pt(12)
-                    p.font.name = 'Bodoni MT Condensed'
-                    p.level = 1
+                chunks.append({'institution': institution, 'file': data['file'], 'columns': data['columns'],
+                               'rows': chunk, 'index': idx + 1, 'count': len(row_chunks)})
+    return chunks
+
+
+def pptx_manifest(chunks: list, layout: str) -> dict:
+    """ Manifest of a deck: the layout and the sha256 of the content of each slide. """
+    return {'layout': layout,
+            'slides': [hashlib.sha256(json.dumps(chunk, sort_keys=True).encode('utf-8')).hexdigest() for chunk in chunks]}
+
+
+def pptx_manifest_path(presentation) -> Path:
+    presentation = Path(presentation)
+    return presentation.with_name(presentation.stem + ".manifest.json")
 
 
+def add_text_slide(prs, chunk: dict):
+    """ One slide with the rows of chunk as formatted paragraphs of the body placeholder. """
+    slide = prs.slides.add_slide(prs.slide_layouts[1])
+    title_shape = slide.shapes.title
+    # define the text title policy
+    
+    slide.shapes.title.text = f"{chunk['institution']} ({chunk['index']}/{chunk['count']})"
+    title_font = title_shape.text_frame.paragraphs[0].font
+    title_font.name = 'Calibri'
+    title_font.size = Pt(24)
+    title_font.bold = True
+    textbox = slide.placeholders[1]               
+    tf = textbox.text_frame               
+    tf.clear()
+
+    # File name header
+    p = tf.paragraphs[0]
+    p.text = f"{chunk['file']}"
+    p.font.bold = True
+    p.font.size = Pt(16)
+    p.font.name = 'Bodoni MT Condensed'
+
+    # Column headers
+    header_p = tf.add_paragraph()
+    header_p.text = " | ".join(chunk["columns"])
+    header_p.font.bold = True
+    header_p.font.size = Pt(12)
+    header_p.font.name = 'Bodoni MT Condensed'
+    header_p.level = 1
+
+    # Add each row as values only
+    for row_values in chunk["rows"]:
+        p = tf.add_paragraph()
+        p.text = " | ".join(row_values)
+        p.font.size = Pt(12)
+        p.font.name = 'Bodoni MT Condensed'
+        p.level = 1
+
+
+def add_table_slide(prs, chunk: dict):
+    """ One slide with the rows of chunk in a native table shape (header row + one row per data row). """
+    slide = prs.slides.add_slide(prs.slide_layouts[5])  # title only
+    slide.shapes.title.text = f"{chunk['institution']} ({chunk['index']}/{chunk['count']})"
+    title_font = slide.shapes.title.text_frame.paragraphs[0].font
+    title_font.name = 'Calibri'
+    title_font.size = Pt(24)
+    title_font.bold = True
+
+    # File name header
+    caption = slide.shapes.add_textbox(Inches(0.5), Inches(1.4), prs.slide_width - Inches(1), Inches(0.4)).text_frame.paragraphs[0]
+    caption.text = f"{chunk['file']}"
+    caption.font.bold = True
+    caption.font.size = Pt(16)
+    caption.font.name = 'Bodoni MT Condensed'
+
+    rows = [chunk["columns"]] + chunk["rows"]
+    table = slide.shapes.add_table(len(rows), len(chunk["columns"]), Inches(0.5), Inches(1.9),
+                                   prs.slide_width - Inches(1), Inches(0.3) * len(rows)).table
+    for r_idx, row_values in enumerate(rows):
+        for c_idx, value in enumerate(row_values):
+            cell = table.cell(r_idx, c_idx)
+            cell.text = value
+            font = cell.text_frame.paragraphs[0].font
+            font.size = Pt(10)
+            font.name = 'Bodoni MT Condensed'
+            font.bold = r_idx == 0
+
+
+def create_institutional_pptx(institution_data, presentation, max_rows_per_slide=10, layout: str = 'text', incremental: bool = True):
+    """ Build the deck of institution_data: one slide per chunk of max_rows_per_slide rows, as formatted paragraphs
+    (layout='text') or as a native table (layout='table').
+    With incremental, the sha256 of every slide is kept in <deck>.manifest.json and an existing deck whose slides
+    did not change is not rebuilt. python-pptx cannot move slides between decks, so a changed deck is rebuilt entirely. """
+    chunks = pptx_slide_chunks(institution_data, max_rows_per_slide)
+    manifest = pptx_manifest(chunks, layout)
+    manifest_path = pptx_manifest_path(presentation)
+    if incremental and os.path.exists(presentation) and manifest_path.exists():
+        if json.loads(manifest_path.read_text()) == manifest:
+            print(f"Unchanged, not rebuilt ...: {presentation}")
+            return presentation
+
+    prs = Presentation()  # start fresh
+    add_slide = add_table_slide if layout == 'table' else add_text_slide
+    for chunk in chunks:
+        add_slide(prs, chunk)
+
     prs.save(presentation)
+    manifest_path.write_text(json.dumps(manifest))
     return presentation
 
 
@@ -538,58 +859,70 @@ def main():
         years = args.year.split(',')
         if len(years) == 1:
             years = int(years[0])        
-            condition_year= f"date_part('year',date_heure_extraction) IN ({years})"       
-        else:
-            condition_year= f"date_part('year',date_heure_extraction) IN {tuple(years)}"
-        df_count_all_labo_users = create_statistique_requete(condition_year, type_data='all', condition_labo="") 
+        # half-open timestamp ranges, so the index on date_heure_extraction can be used
+        condition_year = year_range_condition(years)
     else:
-        condition_year= f"date_part('year',date_heure_extraction) >= 2020"
-        df_count_all_labo_users = create_statistique_requete(condition_year, type_data='all', condition_labo="") 
+        condition_year = year_range_condition(start_year=2020)
+
+    # Single extraction: the yakari queries are run once and every dataframe is selected from the result
+    selected_years = [int(year) for year in args.year.split(',')] if args.year else None
+    stats = extract_statistique_requete(condition_year, condition_labo="", chunksize=args.chunksize, aggregate=args.aggregate,
+                                        incremental=args.incremental, years=selected_years, table_format=args.format)
+    report_database_rules()
+    df_count_all_labo_users = create_statistique_requete(condition_year, type_data='all', stats=stats)
+    if not args.year:
         years = df_count_all_labo_users[['year']].drop_duplicates().sort_values(by='year')['year'].tolist()
     
     # Overall statistics for all laboratories   
    
     if not df_count_all_labo_users.empty:
-        create_seaborn_relplot(df_count_all_labo_users, x_var='month2', y_var='nb_users', kind='line', hue ="year", title="Number of Eurofidai's Database Users", legend_labels=years, filename="Number of Eurofidai's Database Users", save=True, height=5, aspect=1.5)
+        create_seaborn_relplot(df_count_all_labo_users, x_var='month2', y_var='nb_users', kind='line', hue ="year", title="Number of Eurofidai's Database Users", legend_labels=years, filename="Number of Eurofidai's Database Users", save=True, height=5, aspect=1.5, render_cache=not args.force_render)
+
+    df_labo = create_statistique_requete(condition_year, type_data='laboratory', stats=stats)
+    df_labo = df_labo[df_labo['nb_codes'] > 0]
+    df_user = create_statistique_requete(condition_year, type_data='user', stats=stats)
+    df_db = create_statistique_requete(condition_year, type_data='database', stats=stats)
+    df_db = df_db[df_db['nb_codes'] > 0]
 
     if args.labo:
-        condition_labo = f"AND node.name = '{args.labo}'"
         labo = args.labo  
-        df_labo = create_statistique_requete(condition_year, type_data='laboratory', condition_labo=condition_labo)
-        df_labo = df_labo[df_labo['nb_codes'] > 0]        
-        df_user = create_statistique_requete(condition_year, type_data='user', condition_labo=condition_labo)
-        df_db = create_statistique_requete(condition_year, type_data='database', condition_labo=condition_labo) 
-        df_db = df_db[df_db['nb_codes'] > 0] 
+        # same rows as the former "AND node.name = '<labo>'" condition, selected from the single extraction
+        df_labo = df_labo[df_labo['institution_name'] == labo]
+        df_user = df_user[df_user['institution_name'] == labo]
+        df_db = df_db[df_db['institution_name'] == labo]
 
         """ Create a folder for each laboratory in the result directory """
         if not df_labo.empty:
             create_institution_folder(df_labo)                           
                     
-        create_and_save_graph(df_labo, df_user, df_db, years, labo)
+        create_and_save_graph(df_labo, df_user, df_db, years, labo, n_jobs=args.jobs, render_cache=not args.force_render)
 
         institution_list = [normalize(labo)]
-        institution_data = extract_data(CHEMIN_INPUT_CSV, institution_list)
+        institution_data = extract_data(CHEMIN_INPUT_CSV, institution_list, table_format=args.format)
         output_pptx= Path(CHEMIN_RESULTAT, labo, f"{labo}_stats.pptx")
-        create_institutional_pptx(institution_data, presentation=output_pptx)
+        create_institutional_pptx(institution_data, presentation=output_pptx, layout=args.pptx_layout, incremental=not args.force_render)
 
     else:
-        condition_labo = ""
-        df_labo = create_statistique_requete(condition_year, type_data='laboratory', condition_labo=condition_labo)
-        df_labo = df_labo[df_labo['nb_codes'] > 0]  
-        df_user = create_statistique_requete(condition_year, type_data='user', condition_labo=condition_labo)
-        df_db = create_statistique_requete(condition_year, type_data='database', condition_labo=condition_labo)
-        df_db = df_db[df_db['nb_codes'] > 0] 
-
         """ Create a folder for each laboratory in the result directory """
         if not df_labo.empty:
             create_institution_folder(df_labo)   
         
+        # the (institution, year, chart) jobs of every laboratory are rendered together by the worker pool
+        graph_jobs = []
         for labo in df_labo['institution_name'].unique():
-            create_and_save_graph(df_labo, df_user, df_db, years, labo)
-            institution_list = [normalize(labo)]
-            institution_data = extract_data(CHEMIN_INPUT_CSV, institution_list)
+            graph_jobs.extend(create_graph_jobs(df_labo, df_user, df_db, years, labo, render_cache=not args.force_render))
+        render_graph_jobs(graph_jobs, n_jobs=args.jobs)
+
+        # the input CSV files are read once for all the laboratories
+        institution_data = extract_data(CHEMIN_INPUT_CSV, df_labo['institution_name'].unique(), table_format=args.format)
+        for labo in df_labo['institution_name'].unique():
+            labo_data = {normalize(labo): institution_data[normalize(labo)]} if normalize(labo) in institution_data else {}
             output_pptx= Path(CHEMIN_RESULTAT, labo, f"{labo}_stats.pptx")
-            create_institutional_pptx(institution_data, presentation=output_pptx)
+            create_institutional_pptx(labo_data, presentation=output_pptx, layout=args.pptx_layout, incremental=not args.force_render)
+
+    # close the shared figure and the pooled yakari connections
+    close_bar_renderer()
+    dispose_engines()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
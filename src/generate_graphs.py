@@ -1,7 +1,14 @@
 import os
+import sys
+import glob
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 import matplotlib.pyplot as plt
 from pathlib import Path
+sys.path.append(str(Path(os.getcwd())))
+from utils.TableStore import write_table, read_table
 
 
 # Set your directories
@@ -9,79 +16,178 @@ BASE_DIR = "/home/groups/daily/travail/Bertrand/Developpement/daily_users_stats/
 EXCEL_DIR = Path("/home/groups/daily/travail/Bertrand/Developpement/daily_users_stats/stat_graphs_files")
 GRAPH_DIR = os.path.join(BASE_DIR, "graphs")
 
+# Parquet copies of the Excel files, named after the mtime and the size of the workbook they were read from
+CACHE_DIR = os.path.join(BASE_DIR, ".cache")
+
 os.makedirs(GRAPH_DIR, exist_ok=True)
 
-# Load Excel files
-df_total_codes = pd.read_excel(os.path.join(EXCEL_DIR, "stats_sum_of_codes.xlsx"))
-df_unique_users = pd.read_excel(os.path.join(EXCEL_DIR, "stats_number_of_unique_users.xlsx"))
-df_user_codes = pd.read_excel(os.path.join(EXCEL_DIR, "user_monthly_sum_of_codes.xlsx"))
-df_institution_codes = pd.read_excel(os.path.join(EXCEL_DIR, "institution_monthly_sum_of_codes.xlsx"))
+# Excel files read by the process (file name -> dataframe)
+INPUTS = {}
+
+
+def load_excel_input(file_name: str) -> pd.DataFrame:
+    """ Return the dataframe of an Excel file of EXCEL_DIR, read on first use only.
+    The workbook is parsed once per version: a Parquet copy keyed by its mtime and size is kept in CACHE_DIR
+    and read instead of the workbook as long as the workbook is not modified. """
+    if file_name in INPUTS:
+        return INPUTS[file_name]
+
+    excel_path = Path(EXCEL_DIR, file_name)
+    stat = excel_path.stat()
+    stem = excel_path.stem
+    cache_path = Path(CACHE_DIR, f"{stem}.{stat.st_mtime_ns}_{stat.st_size}.parquet")
+    if cache_path.exists():
+        df = read_table(cache_path)
+    else:
+        df = pd.read_excel(excel_path)
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            # the copies of the previous versions of the workbook are removed
+            for stale_path in glob.glob(os.path.join(CACHE_DIR, f"{glob.escape(stem)}.*_*.parquet")):
+                os.remove(stale_path)
+            write_table(df, cache_path, 'parquet')
+        except (ImportError, OSError, ValueError, TypeError) as e:
+            # pyarrow missing, cache folder not writable, or a mixed-type column (ArrowInvalid / ArrowTypeError):
+            # the workbook read above is used without cache
+            print(f"No Parquet cache for {file_name}: {e}")
+    INPUTS[file_name] = df
+    return df
+
+
+# Default rendering of the charts (see --dpi / --format)
+CHART_DPI = 300
+CHART_FORMAT = "png"
+
+MONTH_ORDER = [
+    'January', 'February', 'March', 'April', 'May', 'June',
+    'July', 'August', 'September', 'October', 'November', 'December'
+]
+
+
+def save_chart(fig, name: str, dpi: int = CHART_DPI, fmt: str = CHART_FORMAT) -> str:
+    """ Save a chart figure in GRAPH_DIR as <name>.<fmt>, close it and return its path. """
+    filename = os.path.join(GRAPH_DIR, f"{name}.{fmt}")
+    fig.savefig(filename, dpi=dpi, format=fmt)
+    plt.close(fig)
+    return filename
 
 
-      
 # --- Chart 1: Total Codes Per Month by Year (grouped bars) ---
-def plot_total_codes_by_month():
-    month_order = [
-        'January', 'February', 'March', 'April', 'May', 'June',
-        'July', 'August', 'September', 'October', 'November', 'December'
-    ]
-    df_total_codes['month2'] = pd.Categorical(df_total_codes['month2'], categories=month_order, ordered=True)
+def draw_total_codes_by_month():
+    df_total_codes = load_excel_input("stats_sum_of_codes.xlsx").copy()
+    df_total_codes['month2'] = pd.Categorical(df_total_codes['month2'], categories=MONTH_ORDER, ordered=True)
     pivot_df = df_total_codes.pivot_table(index='month2', columns='year', values='sum_of_codes', aggfunc='sum')
-    pivot_df = pivot_df.loc[month_order]
+    pivot_df = pivot_df.loc[MONTH_ORDER]
 
-    pivot_df.plot(kind='bar', figsize=(14, 6))
+    ax = pivot_df.plot(kind='bar', figsize=(14, 6))
     plt.title('Monthly Code Extractions by Year')
     plt.xlabel('Month')
     plt.ylabel('Sum of Codes')
     plt.xticks(rotation=45)
     plt.legend(title='Year')
     plt.tight_layout()
-    plt.savefig(os.path.join(GRAPH_DIR, "total_codes_by_month_grouped.png"), dpi=300)
-    plt.close()
+    return ax.figure, "total_codes_by_month_grouped"
+
+
+def plot_total_codes_by_month(dpi: int = CHART_DPI, fmt: str = CHART_FORMAT) -> str:
+    return save_chart(*draw_total_codes_by_month(), dpi=dpi, fmt=fmt)
+
 
 # --- Chart 2: Unique Users by Month ---
-def plot_unique_users():
-    df_unique_users['month2'] = pd.Categorical(df_unique_users['month2'], categories=month_order, ordered=True)
+def draw_unique_users():
+    df_unique_users = load_excel_input("stats_number_of_unique_users.xlsx").copy()
+    df_unique_users['month2'] = pd.Categorical(df_unique_users['month2'], categories=MONTH_ORDER, ordered=True)
     df_unique_users.sort_values(by=['year', 'month2'], inplace=True)
     
     # 🔧 Fix: Cast month2 to str before combining
     df_unique_users['period'] = df_unique_users['year'].astype(str) + '-' + df_unique_users['month2'].astype(str)
 
-    plt.figure(figsize=(14, 5))
+    fig = plt.figure(figsize=(14, 5))
     plt.bar(df_unique_users['period'], df_unique_users['nb_unique_users'], color='slateblue')
     plt.title("Number of Unique Users Per Month")
     plt.xticks(rotation=45)
     plt.ylabel("Unique Users")
     plt.tight_layout()
-    plt.savefig(os.path.join(GRAPH_DIR, "unique_users_by_month.png"), dpi=300)
-    plt.close()
+    return fig, "unique_users_by_month"
+
+
+def plot_unique_users(dpi: int = CHART_DPI, fmt: str = CHART_FORMAT) -> str:
+    return save_chart(*draw_unique_users(), dpi=dpi, fmt=fmt)
+
 
 # --- Chart 3: Institution Activity (1 chart per year) ---
-def plot_institution_activity_by_year():
-    df = df_institution_codes.copy()
-    df['label'] = df['month2'] + " - " + df['institution_name']
-    df.sort_values(by=['year', 'month2', 'institution_name'], inplace=True)
-
-    for year, df_year in df.groupby('year'):
-        plt.figure(figsize=(12, len(df_year) * 0.25))
-        plt.barh(df_year['label'], df_year['sum_of_codes'], color='skyblue')
-        plt.title(f'Institution Code Extractions – {year}')
-        plt.xlabel('Sum of Codes')
-        plt.tight_layout()
-        filename = os.path.join(GRAPH_DIR, f"institution_codes_{year}.png")
-        plt.savefig(filename, dpi=300)
-        plt.close()
+def institution_activity_years() -> list:
+    return sorted(load_excel_input("institution_monthly_sum_of_codes.xlsx")['year'].unique().tolist())
+
+
+def draw_institution_activity(year: int):
+    df = load_excel_input("institution_monthly_sum_of_codes.xlsx")
+    df_year = df[df['year'] == year].copy()
+    df_year['label'] = df_year['month2'] + " - " + df_year['institution_name']
+    df_year.sort_values(by=['year', 'month2', 'institution_name'], inplace=True)
+
+    fig = plt.figure(figsize=(12, len(df_year) * 0.25))
+    plt.barh(df_year['label'], df_year['sum_of_codes'], color='skyblue')
+    plt.title(f'Institution Code Extractions – {year}')
+    plt.xlabel('Sum of Codes')
+    plt.tight_layout()
+    return fig, f"institution_codes_{year}"
+
+
+def plot_institution_activity_by_year(dpi: int = CHART_DPI, fmt: str = CHART_FORMAT) -> list:
+    return [save_chart(*draw_institution_activity(year), dpi=dpi, fmt=fmt) for year in institution_activity_years()]
+
+
+# --- Chart jobs ---
+def create_chart_jobs(dpi: int = CHART_DPI, fmt: str = CHART_FORMAT) -> list:
+    """ Return one job per chart (one per year for the institution activity): {'draw', 'args', 'dpi', 'format'}. """
+    draws = [(draw_total_codes_by_month, ()), (draw_unique_users, ())]
+    draws += [(draw_institution_activity, (year,)) for year in institution_activity_years()]
+    return [{'draw': draw, 'args': args, 'dpi': dpi, 'format': fmt} for draw, args in draws]
+
+
+def run_chart_job(job: dict) -> tuple:
+    """ Draw and save the chart of a job. Returns (path, draw seconds, save seconds); the saving includes
+    the rasterization of the figure at the requested dpi. """
+    start = time.perf_counter()
+    fig, name = job['draw'](*job['args'])
+    drawn = time.perf_counter()
+    path = save_chart(fig, name, dpi=job['dpi'], fmt=job['format'])
+    return path, drawn - start, time.perf_counter() - drawn
+
+
+def init_chart_worker():
+    """ Worker processes render with the non-interactive Agg backend. """
+    import matplotlib
+    matplotlib.use('Agg')
+
+
+def run_chart_jobs(jobs: list, n_jobs: int = 1) -> list:
+    """ Run the chart jobs one after another, or in a pool of n_jobs worker processes (0 = one per core),
+    and print the draw and save time of each chart. Returns the list of (path, draw seconds, save seconds). """
+    if n_jobs == 0:
+        n_jobs = os.cpu_count()
+    if n_jobs is None or n_jobs <= 1 or len(jobs) <= 1:
+        results = [run_chart_job(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=init_chart_worker) as executor:
+            results = list(executor.map(run_chart_job, jobs))
+
+    for path, draw_time, save_time in results:
+        print(f"{os.path.basename(path)}: draw {draw_time:.2f}s, save {save_time:.2f}s")
+    return results
+
 
 # --- Run all charts ---
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate the charts of the Excel statistics files.")
+    parser.add_argument('--dpi', type=int, default=CHART_DPI, help=f"Resolution of the charts (default {CHART_DPI}, lower for quick previews)")
+    parser.add_argument('--format', choices=['png', 'jpg', 'svg', 'pdf'], default=CHART_FORMAT, help=f"File format of the charts (default {CHART_FORMAT})")
+    parser.add_argument('--jobs', '-j', type=int, default=1, help="Number of worker processes rendering the charts (default 1, 0 for one per core)")
+    args = parser.parse_args()
+
     print("Generating charts...")
-    month_order = [
-        'January', 'February', 'March', 'April', 'May', 'June',
-        'July', 'August', 'September', 'October', 'November', 'December'
-    ]
-   
-    plot_total_codes_by_month()
-    plot_unique_users()
-    plot_institution_activity_by_year()
-
-    print(f"✅ All charts saved in: {GRAPH_DIR}")
+    start_time = time.perf_counter()
+    results = run_chart_jobs(create_chart_jobs(dpi=args.dpi, fmt=args.format), n_jobs=args.jobs)
+
+    print(f"✅ {len(results)} charts saved in: {GRAPH_DIR} ({time.perf_counter() - start_time:.2f}s)")
@@ -6,13 +6,19 @@ from pathlib import Path
 import seaborn as sns
 import matplotlib.pyplot as plt
 sys.path.append(str(Path(os.getcwd())))
-from utils.dbclient.DatabaseClient import DbConnector
-from openpyxl import load_workbook
+from utils.dbclient.DatabaseClient import DbConnector, dispose_engines
+from utils.Toolbox_lib import year_range_condition, MONTH_NAMES
+from utils.UsageCube import UsageCube
+from utils.DatabaseClassifier import classify_database_names, report_database_rules
+from copy import copy
+from openpyxl import load_workbook, Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
 from module.env import *
 
 #DEV_python = Path("C:/Users/akash/Documents/DEV_python")
 
-condition_year= f"date_part('year',date_heure_extraction) IN (2021,2022,2023,2024,2025)" 
+condition_year = year_range_condition([2021,2022,2023,2024,2025])
 condition_labo = ""
 
 # Define base folder
@@ -39,26 +45,7 @@ def create_statistique_requete(condition_year: str, type_data: str , condition_l
     WHEN 1 THEN 'prévisualisation' \
     WHEN 2 THEN 'téléchargement' \
     WHEN 3 THEN 'téléchargement' \
-    END as type_interrogation2, \
-    CASE \
-    WHEN nom_base_interrogee LIKE '%histo_actions%' THEN 'Stocks' \
-    WHEN nom_base_interrogee LIKE '%actions_%' THEN 'Stocks' \
-    WHEN nom_base_interrogee LIKE '%indices_telekurs%' THEN 'Global\Market Indices' \
-    WHEN nom_base_interrogee LIKE '%histo_indices_telekurs%' THEN 'Global\Market Indices' \
-    WHEN nom_base_interrogee LIKE '%indices_eurofidai%' THEN 'Eurofidai Indices' \
-    WHEN nom_base_interrogee LIKE '%histo_indices_eurofidai%' THEN 'IEurofidai Indices' \
-    WHEN nom_base_interrogee LIKE '%corres_code%' THEN 'Code Mapping Table' \
-    WHEN nom_base_interrogee LIKE '%fonds_mutuel_%' THEN 'Mutual Funds' \
-    WHEN nom_base_interrogee LIKE '%change%' THEN 'Spot Exchange Rate' \
-    WHEN nom_base_interrogee LIKE '%histo_ost%' THEN 'Corporate Events' \
-    WHEN nom_base_interrogee LIKE 'ost%' THEN 'Corporate Events' \
-    WHEN nom_base_interrogee LIKE '%esg%' THEN 'ESG' \
-    WHEN nom_base_interrogee LIKE '%greenbonds%' THEN 'Green Bonds' \
-    END as database_name2, \
-    CASE \
-    WHEN nom_base_interrogee LIKE '%histo%' THEN 'Search_Code' \
-    ELSE 'Extract_Data' \
-    END AS code_ou_data \
+    END as type_interrogation2 \
     FROM statistique_requete as sr LEFT JOIN institution_entity as node \
     ON sr.id_groupe_labo=node.id \
     WHERE {condition_year} AND  nom_groupe_labo NOT IN ('EUROFIDAI','administrateur Drupal') \
@@ -85,8 +72,12 @@ def create_statistique_requete(condition_year: str, type_data: str , condition_l
     # req_extraction_stats and req_extraction_stats_users defined above
 
     # Execute queries
-    df_stats_daily_users = DbConnector('yakari', echo=True).execute_query(req_extraction_stats)
-    df_stats_daily_subscription = DbConnector('yakari', echo=True).execute_query(req_extraction_stats_users)
+    db_yakari = DbConnector('yakari', echo=True)
+    # the two independent queries run at the same time on two pooled connections
+    results = db_yakari.execute_many_concurrently({'stats': req_extraction_stats, 'subscription': req_extraction_stats_users})
+    df_stats_daily_users, df_stats_daily_subscription = results['stats'], results['subscription']
+    # database_name2 and code_ou_data of the distinct database names (see utils.DatabaseClassifier)
+    df_stats_daily_users = classify_database_names(df_stats_daily_users, categorical=False)
 
     # Ensure types
     df_stats_daily_users['year'] = df_stats_daily_users['year'].astype(int)
@@ -114,6 +105,8 @@ def create_statistique_requete(condition_year: str, type_data: str , condition_l
 
 
 def update_excel_sheet_with_dataframe(file_path, sheet_name, dataframe):
+    """ Replace the data rows of a sheet (the header row and the formatting of the template are kept).
+    The rows are appended in bulk with ws.append instead of one ws.cell call per value. """
     wb = load_workbook(file_path)
     ws = wb[sheet_name]
 
@@ -121,60 +114,122 @@ def update_excel_sheet_with_dataframe(file_path, sheet_name, dataframe):
     ws.delete_rows(2, ws.max_row)
 
     # Write new data starting from row 2
-    for r_idx, row in enumerate(dataframe.itertuples(index=False), start=2):
-        for c_idx, value in enumerate(row, start=1):
-            ws.cell(row=r_idx, column=c_idx, value=value)
+    for row in dataframe.itertuples(index=False, name=None):
+        ws.append(row)
 
     wb.save(file_path)
     print(f"Updated: {file_path} (sheet: {sheet_name})")
 
 
-def create_excel_statistics(data: pd.DataFrame):
+def read_header_template(file_path, sheet_name) -> list:
+    """ Return the header cells (first row) of a sheet of a template workbook, None if there is no template. """
+    if not Path(file_path).exists():
+        return None
+    wb = load_workbook(file_path, read_only=True)
+    try:
+        if sheet_name not in wb.sheetnames:
+            return None
+        header = next(wb[sheet_name].iter_rows(min_row=1, max_row=1), None)
+        if header is None:
+            return None
+        return [{'value': cell.value, 'font': copy(cell.font), 'fill': copy(cell.fill), 'border': copy(cell.border),
+                 'alignment': copy(cell.alignment), 'number_format': cell.number_format} for cell in header]
+    finally:
+        wb.close()
+
+
+def write_excel_workbook(file_path, sheets: list):
+    """ Write several dataframes in one workbook with a single save, in openpyxl write-only mode (rows are streamed).
+    sheets is a list of (sheet_name, dataframe, template file_path): the header row is copied with its formatting from
+    the sheet of the template workbook if it exists, otherwise it is made of the dataframe columns in bold. """
+    wb = Workbook(write_only=True)
+    for sheet_name, dataframe, template in sheets:
+        ws = wb.create_sheet(title=sheet_name)
+        header = read_header_template(template, sheet_name) if template else None
+        if header is None:
+            header = [{'value': col, 'font': Font(bold=True)} for col in dataframe.columns]
+        header_cells = []
+        for template_cell in header:
+            cell = WriteOnlyCell(ws, value=template_cell['value'])
+            for style in ('font', 'fill', 'border', 'alignment', 'number_format'):
+                if style in template_cell:
+                    setattr(cell, style, template_cell[style])
+            header_cells.append(cell)
+        ws.append(header_cells)
+
+        for row in dataframe.itertuples(index=False, name=None):
+            ws.append(row)
+
+    wb.save(file_path)
+    print(f"Updated: {file_path} (sheets: {', '.join(sheet_name for sheet_name, _, _ in sheets)})")
+
+
+# dimensions of the cube of the Excel summaries (statut comes from the subscription informations)
+EXCEL_CUBE_DIMENSIONS = ['institution_name', 'user_name', 'statut', 'database_name', 'year', 'month']
+
+
+def add_month_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """ Add the month2 (month name) and month_full ('01 - January') columns from the month column. """
+    df['month2'] = df['month'].map(MONTH_NAMES)
+    df['month_full'] = df['month'].astype(str).str.zfill(2) + ' - ' + df['month2']
+    return df
+
+
+# Excel summaries: (workbook file name, sheet name) in the order of create_excel_statistics
+EXCEL_SUMMARIES = [("stats_number_of_unique_users.xlsx", "UniqueUsers"),
+                   ("stats_sum_of_codes.xlsx", "TotalCodes"),
+                   ("user_monthly_sum_of_codes.xlsx", "Users"),
+                   ("institution_monthly_sum_of_codes.xlsx", "Institutions")]
+SINGLE_WORKBOOK = "stats_summaries.xlsx"
+
+
+def create_excel_statistics(data: pd.DataFrame, single_workbook: bool = False):
+    """ Build the four Excel summaries and write them into their own workbooks (default),
+    or all together into result_dir/SINGLE_WORKBOOK with a single save if single_workbook is True. """
 
     #create directory if not exists
     result_dir.mkdir(parents=True, exist_ok=True)
+
+    # the four summaries are rollups of one cube instead of four groupby over the raw rows
+    cube = UsageCube(data, dimensions=EXCEL_CUBE_DIMENSIONS)
     
-    # --- Save number of unique users ---   
-    df_stats_number_of_unique_users = data.groupby(['year','month_full','month2'])['user_name'].nunique().reset_index(name='nb_unique_users')
+    # --- Number of unique users ---   
+    df_stats_number_of_unique_users = add_month_columns(cube.rollup(['year','month']))
+    df_stats_number_of_unique_users = df_stats_number_of_unique_users[['year','month_full','month2','nb_users']].rename(columns={'nb_users': 'nb_unique_users'})
     df_stats_number_of_unique_users.sort_values(by=['year','month_full','month2'], inplace=True)
-    
-    # 1. Unique Users
-    update_excel_sheet_with_dataframe(
-        file_path=result_dir / "stats_number_of_unique_users.xlsx",
-        sheet_name="UniqueUsers",
-        dataframe=df_stats_number_of_unique_users
-    )
 
-    # --- Save sum of codes per month ---
-    df_stats_sum_of_codes = data.groupby(['year', 'month_full','month2'])['nb_codes'].sum().reset_index(name='sum_of_codes')
+    # --- Sum of codes per month ---
+    df_stats_sum_of_codes = add_month_columns(cube.rollup(['year','month']))
+    df_stats_sum_of_codes = df_stats_sum_of_codes[['year','month_full','month2','nb_codes']].rename(columns={'nb_codes': 'sum_of_codes'})
     df_stats_sum_of_codes.sort_values(by=['year', 'month_full','month2'], inplace=True)
-    
-    # 2. Sum of Codes
-    update_excel_sheet_with_dataframe(
-        file_path=result_dir / "stats_sum_of_codes.xlsx",
-        sheet_name="TotalCodes",
-        dataframe=df_stats_sum_of_codes
-    )
 
-    # --- Save user-level summary ---
-    df_user_monthly_sum = data.groupby(['user_full', 'statut', 'database_name', 'year', 'month_full','month2'])['nb_codes'].sum().reset_index(name='sum_of_codes')
+    # --- User-level summary ---
+    df_user_monthly_sum = cube.slice()
+    df_user_monthly_sum['user_full'] = df_user_monthly_sum['user_name'].fillna('Unknown User').astype(str) + ' - ' + df_user_monthly_sum['institution_name'].fillna('Unknown Institution').astype(str)
+    df_user_monthly_sum = add_month_columns(df_user_monthly_sum.groupby(['user_full', 'statut', 'database_name', 'year', 'month'])['nb_codes'].sum().reset_index(name='sum_of_codes'))
+    df_user_monthly_sum = df_user_monthly_sum[['user_full', 'statut', 'database_name', 'year', 'month_full','month2','sum_of_codes']]
     df_user_monthly_sum.sort_values(by=['user_full', 'year', 'month_full','month2'], inplace=True)
-    # 3. User Monthly Sum
-    update_excel_sheet_with_dataframe(
-        file_path=result_dir / "user_monthly_sum_of_codes.xlsx",
-        sheet_name="Users",
-        dataframe=df_user_monthly_sum
-    )
 
-    # --- Save institution-level summary ---
-    df_institution_monthly_sum = data.groupby(['institution_name', 'database_name', 'year', 'month_full','month2'])['nb_codes'].sum().reset_index(name='sum_of_codes')
+    # --- Institution-level summary ---
+    df_institution_monthly_sum = add_month_columns(cube.rollup(['institution_name', 'database_name', 'year', 'month']))
+    df_institution_monthly_sum = df_institution_monthly_sum[['institution_name', 'database_name', 'year', 'month_full','month2','nb_codes']].rename(columns={'nb_codes': 'sum_of_codes'})
     df_institution_monthly_sum.sort_values(by=['institution_name', 'year', 'month_full','month2'], inplace=True)
-    # 4. Institution Monthly Sum
-    update_excel_sheet_with_dataframe(
-        file_path=result_dir / "institution_monthly_sum_of_codes.xlsx",
-        sheet_name="Institutions",
-        dataframe=df_institution_monthly_sum
-    )
+
+    dataframes = [df_stats_number_of_unique_users, df_stats_sum_of_codes, df_user_monthly_sum, df_institution_monthly_sum]
+
+    if single_workbook:
+        # 1 to 4 in one workbook, the headers are taken from the workbooks of each summary
+        write_excel_workbook(result_dir / SINGLE_WORKBOOK,
+                             [(sheet_name, dataframe, result_dir / file_name) for (file_name, sheet_name), dataframe in zip(EXCEL_SUMMARIES, dataframes)])
+        return
+
+    # 1. Unique Users  2. Sum of Codes  3. User Monthly Sum  4. Institution Monthly Sum
+    for (file_name, sheet_name), dataframe in zip(EXCEL_SUMMARIES, dataframes):
+        update_excel_sheet_with_dataframe(
+            file_path=result_dir / file_name,
+            sheet_name=sheet_name,
+            dataframe=dataframe
+        )
 
 
 if __name__ == "__main__":
@@ -182,13 +237,18 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Generate statistics and graphs from user data.")
     parser.add_argument('--year', type=str, default="2021,2022,2023,2024,2025", help="Years to include in the format 'YYYY,YYYY,...'")
     parser.add_argument('--labo', type=str, default="", help="Laboratory condition for SQL query (e.g., AND id_groupe_labo=3)")
+    parser.add_argument('--single-workbook', action='store_true', help=f"Write the four summaries into {SINGLE_WORKBOOK} (one save) instead of their own workbooks")
     args = parser.parse_args()
 
-    condition_year = f"date_part('year',date_heure_extraction) IN ({args.year})"
+    condition_year = year_range_condition(args.year)
     condition_labo = args.labo
 
     # Fetch data
     df_stats_daily_users = create_statistique_requete(condition_year, "all", condition_labo)
+    report_database_rules()
 
     # Create Excel statistics
-    create_excel_statistics(df_stats_daily_users)
\ No newline at end of file
+    create_excel_statistics(df_stats_daily_users, single_workbook=args.single_workbook)
+
+    # close the pooled yakari connections
+    dispose_engines()
\ No newline at end of file
@@ -15,6 +15,7 @@ import os
 import pandas as pd
 import sys
 import argparse
+from functools import cached_property
 from pathlib import Path
 import seaborn as sns
 import matplotlib.pyplot as plt
@@ -27,8 +28,11 @@ from pptx.util import Pt
 # sinon python ne trouvera pas les modules à importer
 sys.path.append(str(Path(os.getcwd())))
 from utils.LogWriter import log_location, log_config, log_args
-from utils.Toolbox_lib import create_year_calendar
-from utils.dbclient.DatabaseClient import DbConnector
+from utils.Toolbox_lib import create_year_calendar, year_range_condition
+from utils.dbclient.DatabaseClient import DbConnector, dispose_engines
+from utils.ChartRenderer import get_bar_renderer, close_bar_renderer
+from utils.TableStore import write_table
+from utils.DatabaseClassifier import classify_database_names, report_database_rules
 from module.env import *
 os.environ[ 'MPLCONFIGDIR' ] = '/tmp/'
 
@@ -94,10 +98,14 @@ def create_seaborn_relplot(df: pd.DataFrame, x_var: str, y_var: str, kind: str =
     if save:
         print(f"Saving filename ...: {filename}")
         plt.savefig(str(CHEMIN_RESULTAT / f"{filename}.png"))
-    #plt.show()
+    plt.close(g.figure)
 
-def create_and_clean_all_dataframe(save: bool = 1 , user: str = "all") -> list:
+def create_and_clean_all_dataframe(save: bool = 1 , user: str = "all", years: list = None, labos: list = None) -> list:
     # Extraction Statistics Dataframe  
+    # years restricts the extraction with half-open timestamp ranges (index scan on date_heure_extraction)
+    condition_year = f"{year_range_condition(years)} AND" if years else ""
+    # labos restricts the extraction to these institutions
+    condition_labo = "AND node.name IN ({})".format(",".join("'{}'".format(labo.replace("'", "''")) for labo in labos)) if labos else ""
     req_extraction_stats = f"SELECT distinct id_utilisateur_drupal as id_user, nom_utilisateur as user_name ,id_groupe_labo as id_labo , node.name as institution_name, \
     date_part('year',date_heure_extraction) as year, date_part('month',date_heure_extraction) as month, nom_base_interrogee as database_name, \
     type_interrogation, nb_codes_en_entree as nb_codes, date_heure_extraction,CASE date_part('month',date_heure_extraction) \
@@ -118,29 +126,10 @@ def create_and_clean_all_dataframe(save: bool = 1 , user: str = "all") -> list:
     WHEN 1 THEN 'prévisualisation' \
     WHEN 2 THEN 'téléchargement' \
     WHEN 3 THEN 'téléchargement' \
-    END as type_interrogation2, \
-    CASE \
-    WHEN nom_base_interrogee LIKE '%histo_actions%' THEN 'Stocks' \
-    WHEN nom_base_interrogee LIKE '%actions_%' THEN 'Stocks' \
-    WHEN nom_base_interrogee LIKE '%indices_telekurs%' THEN 'Global\Market Indices' \
-    WHEN nom_base_interrogee LIKE '%histo_indices_telekurs%' THEN 'Global\Market Indices' \
-    WHEN nom_base_interrogee LIKE '%indices_eurofidai%' THEN 'Eurofidai Indices' \
-    WHEN nom_base_interrogee LIKE '%histo_indices_eurofidai%' THEN 'IEurofidai Indices' \
-    WHEN nom_base_interrogee LIKE '%corres_code%' THEN 'Code Mapping Table' \
-    WHEN nom_base_interrogee LIKE '%fonds_mutuel_%' THEN 'Mutual Funds' \
-    WHEN nom_base_interrogee LIKE '%change%' THEN 'Spot Exchange Rate' \
-    WHEN nom_base_interrogee LIKE '%histo_ost%' THEN 'Corporate Events' \
-    WHEN nom_base_interrogee LIKE 'ost%' THEN 'Corporate Events' \
-    WHEN nom_base_interrogee LIKE '%esg%' THEN 'ESG' \
-    WHEN nom_base_interrogee LIKE '%greenbonds%' THEN 'Green Bonds' \
-    END as database_name2, \
-    CASE \
-    WHEN nom_base_interrogee LIKE '%histo%' THEN 'Search_Code' \
-    ELSE 'Extract_Data' \
-    END AS code_ou_data \
+    END as type_interrogation2 \
     FROM statistique_requete as sr LEFT JOIN institution_entity as node \
     ON sr.id_groupe_labo=node.id \
-    WHERE nom_groupe_labo NOT IN ('EUROFIDAI','administrateur Drupal') AND  nom_groupe_labo IS NOT NULL AND node.name IS NOT NULL\
+    WHERE {condition_year} nom_groupe_labo NOT IN ('EUROFIDAI','administrateur Drupal') AND  nom_groupe_labo IS NOT NULL AND node.name IS NOT NULL {condition_labo} \
     AND id_utilisateur_drupal NOT IN (1178,1922,367,274,594,896,904) \
     ORDER BY year,month,date_heure_extraction,id_utilisateur_drupal,node.name \
     ;"
@@ -155,8 +144,12 @@ def create_and_clean_all_dataframe(save: bool = 1 , user: str = "all") -> list:
             WHERE ufd.uid NOT IN (1178,1922,367,274) AND ie.name NOT IN ('EUROFIDAI','administrateur Drupal', 'probesys2 probesys') AND ie.name IS NOT NULL \
              ORDER BY  ie.name, ufd.uid ;"
 
-    df_stats_daily_users = DbConnector('yakari', echo=True).execute_query(req_extraction_stats)
-    df_stats_daily_subscription = DbConnector('yakari', echo=True).execute_query(req_extraction_stats_users)
+    db_yakari = DbConnector('yakari', echo=True)
+    # the two independent queries run at the same time on two pooled connections
+    results = db_yakari.execute_many_concurrently({'stats': req_extraction_stats, 'subscription': req_extraction_stats_users})
+    df_stats_daily_users, df_stats_daily_subscription = results['stats'], results['subscription']
+    # database_name2 and code_ou_data of the distinct database names (see utils.DatabaseClassifier)
+    df_stats_daily_users = classify_database_names(df_stats_daily_users, categorical=False)
     df_stats_users_with_subscription = df_stats_daily_users.merge(df_stats_daily_subscription, how='left', left_on='id_user', right_on='id_user')
     
     df_stats_users_with_subscription = df_stats_users_with_subscription[df_stats_users_with_subscription['labo_name'].isnull() == False].drop_duplicates()
@@ -216,16 +209,13 @@ def create_and_clean_all_dataframe(save: bool = 1 , user: str = "all") -> list:
     df_all_db.sort_values(by=['institution_name','database_name2','year'],inplace=True) 
 
     if save:
-        df_stats_daily_subscription.to_csv(str(CHEMIN_RESULTAT / "raw_data_stats_daily_subscription.csv"), index=False, encoding='utf-8',  sep='|')
-        df_stats_users_with_subscription.to_csv(str(CHEMIN_RESULTAT / "stats_all_users_with_subscription_informations.csv"), index=False, encoding='utf-8',  sep='|')
-        df_stats_users_with_subscription.to_csv(str(CHEMIN_INPUT_CSV / "stats_all_users_with_subscription_informations.csv"), index=False, encoding='utf-8',  sep='|')
-        df_stats_number_of_all_subscribers_per_labo.to_csv(str(CHEMIN_RESULTAT / "stats_number_of_subscribers_per_labo_and_status.csv"), index=False, encoding='utf-8', sep='|')
-        df_stats_number_of_all_subscribers_per_labo.to_csv(str(CHEMIN_INPUT_CSV / "stats_number_of_subscribers_per_labo_and_status.csv"), index=False, encoding='utf-8', sep='|')
-        df_stats_number_of_subscribers_created.to_csv(str(CHEMIN_RESULTAT / "stats_number_of_subscribers_per_status_and_year_creation.csv"), index=False, encoding='utf-8', sep='|')
-        df_stats_number_of_subscribers_created.to_csv(str(CHEMIN_INPUT_CSV / "stats_number_of_subscribers_per_status_and_year_creation.csv"), index=False, encoding='utf-8', sep='|')
-        df_stats_number_of_subscribers_last_access.to_csv(str(CHEMIN_RESULTAT / "stats_number_of_subscribers_per_status_and_year_last_access.csv"), index=False, encoding='utf-8', sep='|') 
-        df_stats_number_of_subscribers_last_access.to_csv(str(CHEMIN_INPUT_CSV / "stats_number_of_subscribers_per_status_and_year_last_access.csv"), index=False, encoding='utf-8', sep='|') 
-        df_stats_daily_users.to_csv(str(CHEMIN_RESULTAT / "raw_data_stats_daily_users.csv"), index=False, encoding='utf-8', sep='|')
+        # each table is written once (unchanged files are not rewritten) and linked into CHEMIN_INPUT_CSV
+        write_table(df_stats_daily_subscription, CHEMIN_RESULTAT / "raw_data_stats_daily_subscription.csv")
+        write_table(df_stats_users_with_subscription, CHEMIN_RESULTAT / "stats_all_users_with_subscription_informations.csv", links=[CHEMIN_INPUT_CSV])
+        write_table(df_stats_number_of_all_subscribers_per_labo, CHEMIN_RESULTAT / "stats_number_of_subscribers_per_labo_and_status.csv", links=[CHEMIN_INPUT_CSV])
+        write_table(df_stats_number_of_subscribers_created, CHEMIN_RESULTAT / "stats_number_of_subscribers_per_status_and_year_creation.csv", links=[CHEMIN_INPUT_CSV])
+        write_table(df_stats_number_of_subscribers_last_access, CHEMIN_RESULTAT / "stats_number_of_subscribers_per_status_and_year_last_access.csv", links=[CHEMIN_INPUT_CSV])
+        write_table(df_stats_daily_users, CHEMIN_RESULTAT / "raw_data_stats_daily_users.csv")
 
 
     return [df_stats_users_with_subscription,df_all_laboratories, df_per_laboratory, df_all_users, df_all_db] 
@@ -238,8 +228,129 @@ def parse_arguments():
     return args
 
 
-[DF_STATS_INFOS,DF_STATS_INSTITUTIONS_ALL_USERS,DF_STATS_NUMBER_ALL_INSTITUTIONS,
- DF_STATS_NUMBER_ALL_USERS,DF_STATS_NUMBER_ALL_DATABASES] = create_and_clean_all_dataframe() 
+class FrameIndex:
+    """ Positions of the rows of a dataframe per value of its key column(s), built once with a groupby,
+    so a lookup only reads the matching rows instead of scanning the whole dataframe with a boolean mask.
+    With normalized=True the key is compared with normalize() (strip + lower case). """
+
+    def __init__(self, df: pd.DataFrame, keys, normalized: bool = False):
+        self.df = df
+        self.normalized = normalized
+        if normalized:
+            self.positions = df.groupby(df[keys].astype(str).str.strip().str.lower()).indices
+        else:
+            self.positions = df.groupby(keys).indices
+
+    def __repr__(self) -> str:
+        return f"FrameIndex(keys={len(self.positions)}, rows={len(self.df)})"
+
+    def __contains__(self, key) -> bool:
+        return self._key(key) in self.positions
+
+    def _key(self, key):
+        return normalize(key) if self.normalized else key
+
+    def keys(self) -> list:
+        return list(self.positions.keys())
+
+    def rows(self, key) -> pd.DataFrame:
+        """ Return the rows of key (a tuple for several key columns), empty if key is unknown. """
+        positions = self.positions.get(self._key(key))
+        if positions is None:
+            return self.df.iloc[0:0]
+        return self.df.iloc[positions]
+
+    def values(self, key, column: str) -> list:
+        """ Return the distinct values of column in the rows of key. """
+        return self.rows(key)[column].unique().tolist()
+
+
+class StatsContext:
+    """ The stats dataframes and their indexes for the User, Database and Institution objects.
+    Nothing is extracted when the context is created: the yakari queries run on the first access to a dataframe
+    (once, the result is memoized), restricted to years and labos if given. The CSV files are only written by an
+    unscoped context (all the years and all the laboratories), they always hold the full history. """
+
+    def __init__(self, years: list = None, labos: list = None):
+        self.years = years
+        self.labos = labos
+
+    def __repr__(self) -> str:
+        return f"StatsContext(years={self.years}, labos={self.labos}, loaded={'frames' in self.__dict__})"
+
+    @cached_property
+    def frames(self) -> list:
+        return create_and_clean_all_dataframe(save=not (self.years or self.labos), years=self.years, labos=self.labos)
+
+    @property
+    def infos(self) -> pd.DataFrame:
+        return self.frames[0]
+
+    @property
+    def institutions_all_users(self) -> pd.DataFrame:
+        return self.frames[1]
+
+    @property
+    def number_all_institutions(self) -> pd.DataFrame:
+        return self.frames[2]
+
+    @property
+    def number_all_users(self) -> pd.DataFrame:
+        return self.frames[3]
+
+    @property
+    def number_all_databases(self) -> pd.DataFrame:
+        return self.frames[4]
+
+    # indexes of the stats dataframes, built once for all the User, Database and Institution objects
+    @cached_property
+    def index_infos_by_user(self) -> FrameIndex:
+        return FrameIndex(self.infos, 'id_user')
+
+    @cached_property
+    def index_infos_by_database(self) -> FrameIndex:
+        return FrameIndex(self.infos, 'database_name2', normalized=True)
+
+    @cached_property
+    def index_infos_by_labo(self) -> FrameIndex:
+        return FrameIndex(self.infos, 'labo_name', normalized=True)
+
+    @cached_property
+    def index_infos_by_institution(self) -> FrameIndex:
+        return FrameIndex(self.infos, 'institution_name')
+
+    @cached_property
+    def index_number_institutions(self) -> FrameIndex:
+        return FrameIndex(self.number_all_institutions, ['institution_name', 'year'])
+
+    @cached_property
+    def index_number_users(self) -> FrameIndex:
+        return FrameIndex(self.number_all_users, ['institution_name', 'year'])
+
+    @cached_property
+    def index_number_databases(self) -> FrameIndex:
+        return FrameIndex(self.number_all_databases, ['institution_name', 'year'])
+
+    @cached_property
+    def labo_names(self) -> set:
+        return set(self.infos['labo_name'].tolist())
+
+    @cached_property
+    def stats_years(self) -> set:
+        return set(self.infos['year'].tolist())
+
+
+# context of the process, created by get_stats_context()
+STATS_CONTEXT = None
+
+
+def get_stats_context(years: list = None, labos: list = None) -> StatsContext:
+    """ Return the stats context of the process. A new context is created for a different scope (years, labos);
+    without arguments the current context is returned (a context of all the data if there is none). """
+    global STATS_CONTEXT
+    if STATS_CONTEXT is None or ((years is not None or labos is not None) and (STATS_CONTEXT.years, STATS_CONTEXT.labos) != (years, labos)):
+        STATS_CONTEXT = StatsContext(years=years, labos=labos)
+    return STATS_CONTEXT
 
 
 class User:
@@ -248,7 +359,8 @@ class User:
     def __init__(self, name: str, id: int):
         self.name = name
         self.id = id 
-        self.data = DF_STATS_INFOS 
+        self.context = get_stats_context()
+        self.data = self.context.infos
 
     def set_name(self, name: str):
         self.name = name
@@ -263,8 +375,8 @@ class User:
         return self.id
      
     def __str__(self) -> str:
-        date_created =list(self.data[self.data['id_user'] == self.id]['date_created'].unique())
-        date_last_access = list(self.data[self.data['id_user'] == self.id]['date_last_access'].unique())
+        date_created = self.context.index_infos_by_user.values(self.id, 'date_created')
+        date_last_access = self.context.index_infos_by_user.values(self.id, 'date_last_access')
         return f"User(name={self.name}, id={self.id}, date_created={date_created}, date_last_access={date_last_access})"
     
     def __repr__(self) -> str:
@@ -272,7 +384,7 @@ class User:
     
     def list_user_databases(self) -> list:
         """ This function returns the list of databases used by the user."""
-        user_databases = self.data[self.data['id_user'] == self.id]['database_name2'].unique().tolist()
+        user_databases = self.context.index_infos_by_user.values(self.id, 'database_name2')
         return user_databases
     
 
@@ -283,7 +395,8 @@ class Database:
 
     def __init__(self, name: str):
         self.name = name
-        self.data = DF_STATS_INFOS
+        self.context = get_stats_context()
+        self.data = self.context.infos
 
     def set_name(self, name: str):
         self.name = name
@@ -299,7 +412,7 @@ class Database:
     
     def list_database_users(self) -> list:
         """ This function returns the list of users who have used the database."""
-        database_users = self.data[normalize(self.data['database_name2']) == normalize(self.name)]['user_name'].unique().tolist()
+        database_users = self.context.index_infos_by_database.values(self.name, 'user_name')
         return database_users
     
 
@@ -310,9 +423,10 @@ class Institution:
     
     def __init__(self, name: str):
         self.name : str = name
-        self.data : pd.DataFrame = DF_STATS_INFOS
+        self.context : StatsContext = get_stats_context()
+        self.data : pd.DataFrame = self.context.infos
         self.institution_folder : str = self.name.strip().replace(",","").replace(" ", "_")       
-        if self.name not in set(self.data['labo_name'].tolist()):
+        if self.name not in self.context.labo_names:
             raise ValueError(f"The institution '{self.name}' does not exist in the database. Please check the spelling and the capitalization and try again.")
     
     def set_name(self, name: str):
@@ -329,12 +443,12 @@ class Institution:
     
     def list_institution_users(self) -> list:
         """ This function returns the list of users who belong to the institution."""
-        institution_users = self.data[normalize(self.data['labo_name']) == normalize(self.name)]['user_name'].unique().tolist()
+        institution_users = self.context.index_infos_by_labo.values(self.name, 'user_name')
         return institution_users
     
     def list_institution_databases(self) -> list:
         """ This function returns the list of databases used by the institution."""
-        institution_databases = self.data[normalize(self.data['labo_name']) == normalize(self.name)]['database_name2'].unique().tolist()
+        institution_databases = self.context.index_infos_by_labo.values(self.name, 'database_name2')
         return institution_databases
     
     def create_institution_folder(self):
@@ -347,54 +461,14 @@ class Institution:
     
     def create_graph(self, df : pd.DataFrame, year: int, x_var: str, y_var: str, color: str , legend_title: str=None, \
                   xlabel: str = None, ylabel: str = None, title: str = None,  save: bool = False, **kwargs):            
-        """ This function creates a bar graph for a specific laboratory and year."""
-
-        def get_multiple_locator(n: int) -> int:
-            """ This function returns the multiple locator for the y-axis based on the number of digits in the number.
-            For example, if the number is 1250, it returns 1000, if the number is 158, it returns 100, and so on."""
-            magnitude = 0   
-            multiple = {}
-            while n >= 10:
-                n //= 10
-                magnitude += 1    
-
-            multiple = {0:10, 1:10, 2:100, 3:1000, 4:10000, 5:100000,6:1000000,7:10000000,8:100000000,9:1000000000}
-            return multiple[magnitude]
-                
-        fig, ax = plt.subplots(figsize=(12, 8))
-        plt.style.use('seaborn-v0_8-dark-palette')
-        plt.rc('font', size=12, family='Arial', weight='normal')  # Set font properties
-        ax.spines[['bottom', 'top', 'right']].set_visible(True)  # Hide spines    
-        bc = ax.bar(df[x_var], df[y_var], color=color ) # barh for horizontal   
-        ax.tick_params(axis='x', rotation=70, labelsize=10)  # Rotate x-axis labels 
-
-        ax.bar_label(bc, labels=df[y_var], padding=30, fmt='%s', fontsize=10)  # fmt='%s' for string labels
-        
-        # Add custom legend if needed
-        ax.legend(title=legend_title, loc='upper right', labels=[f"{year}"])
-        ax.set_xlabel(xlabel, fontsize=14, loc='center', fontweight='bold')
-        ax.set_ylabel(ylabel, fontsize=14, loc='center', fontweight='bold')
-        ax.set_title(f"{self.name}({year})", fontsize=20, fontweight='bold', \
-                    backgroundcolor='lightgrey', loc='center', pad=15)
-
-        from matplotlib.ticker import MultipleLocator
-        max_value = df[y_var].max()
-        if max_value <= 100 :   # Set x-axis limits
-            ax.set_ylim(0, max_value + 10) 
-        elif max_value <= 50000:
-            ax.set_ylim(0, max_value + max_value*0.5) 
-        elif max_value > 50000:
-            ax.set_ylim(0, max_value + max_value*0.35)
-        
-        multiple = get_multiple_locator(max_value)
-        ax.yaxis.set_major_locator(MultipleLocator(multiple))  # Keep x-axis ticks as multiples of 5 for horizontal
-        
-        plt.tight_layout()  # Adjust subplot parameters to give specified padding
+        """ This function creates a bar graph for a specific laboratory and year with the shared renderer of the process."""
         CHEMIN_LABO = Path(CHEMIN_RESULTAT, self.institution_folder)
+        path = None
         if save:
             print(f"Saving filename ...: {title}")
-            plt.savefig(str(CHEMIN_LABO/f"{title}.png"), bbox_inches='tight')  # Ensure all elements are included
-        #plt.show()
+            path = CHEMIN_LABO/f"{title}.png"
+        get_bar_renderer().bar_chart(df, x_var=x_var, y_var=y_var, color=color, title=f"{self.name}({year})", legend_title=legend_title,
+                                     legend_label=f"{year}", xlabel=xlabel, ylabel=ylabel, path=path)
 
     def create_and_save_graph(self,  years: int):  
 
@@ -413,18 +487,18 @@ class Institution:
 
         if isinstance(years, int): 
             # graphics Laboratories 
-            df_stats_number_all_labo_per_year =  DF_STATS_NUMBER_ALL_INSTITUTIONS[(DF_STATS_NUMBER_ALL_INSTITUTIONS['institution_name'] == self.name) & (DF_STATS_NUMBER_ALL_INSTITUTIONS['year'] == int(years))]
+            df_stats_number_all_labo_per_year = self.context.index_number_institutions.rows((self.name, int(years)))
             if not df_stats_number_all_labo_per_year.empty:               
                 self.create_graph(df_stats_number_all_labo_per_year, year=years, x_var='month2', y_var='nb_codes', \
                 color='lightsteelblue', legend_title ="Number of extracted Eurofidai codes", xlabel="Month", ylabel ="Number of codes" , title=f'{self.institution_folder}_{years}', save=True)          
             # graphics Users
-            df_stats_number_all_users_per_year = DF_STATS_NUMBER_ALL_USERS[(DF_STATS_NUMBER_ALL_USERS['year'] == years) & (DF_STATS_NUMBER_ALL_USERS["institution_name"] == self.name)]
+            df_stats_number_all_users_per_year = self.context.index_number_users.rows((self.name, int(years)))
             if not df_stats_number_all_users_per_year.empty:           
                 self.create_graph(df_stats_number_all_users_per_year, year=years, x_var='month2', y_var='nb_users', \
                 color='darkred', legend_title ="Number of users", xlabel="Month", ylabel ="Number of users" , title=f'{ self.institution_folder}_users_{years}', save=True)          
             
             # graphics Databases
-            df_stats_number_all_databases_year = DF_STATS_NUMBER_ALL_DATABASES[(DF_STATS_NUMBER_ALL_DATABASES['year'] == years) & (DF_STATS_NUMBER_ALL_DATABASES["institution_name"] == self.name)]
+            df_stats_number_all_databases_year = self.context.index_number_databases.rows((self.name, int(years)))
             if not df_stats_number_all_databases_year.empty:
                     self.create_graph(df_stats_number_all_databases_year, year=years, x_var='database_name2', y_var='nb_codes', \
                 color='deeppink', legend_title ="Number of extracted Eurofidai codes", xlabel="Database", ylabel ="Number of codes" , title=f'{self.institution_folder}_database_{years}', save=True)   
@@ -432,19 +506,19 @@ class Institution:
         elif isinstance(years, list):
             # graphics Laboratories 
             for year in years:
-                df_stats_number_all_labo =  DF_STATS_NUMBER_ALL_INSTITUTIONS[(DF_STATS_NUMBER_ALL_INSTITUTIONS['institution_name'] == self.name) & (DF_STATS_NUMBER_ALL_INSTITUTIONS['year'] == int(year))]                    
+                df_stats_number_all_labo = self.context.index_number_institutions.rows((self.name, int(year)))                    
                 if not df_stats_number_all_labo.empty:              
                     self.create_graph( df_stats_number_all_labo, year=year, x_var='month2', y_var='nb_codes', \
                 color='lightsteelblue', legend_title ="Number of extracted Eurofidai codes", xlabel="Month", ylabel ="Number of codes" , title=f'{labo}_{year}', save=True)                   
                 
                 # graphics Users
-                df_stats_number_all_users = DF_STATS_NUMBER_ALL_USERS[(DF_STATS_NUMBER_ALL_USERS['year'] == int(year)) & (DF_STATS_NUMBER_ALL_USERS["institution_name"] == self.name)]
+                df_stats_number_all_users = self.context.index_number_users.rows((self.name, int(year)))
                 if not df_stats_number_all_users.empty:           
                     self.create_graph(df_stats_number_all_users, year=year, x_var='month2', y_var='nb_users', \
                     color='darkred', legend_title ="Number of users", xlabel="Month", ylabel ="Number of users" , title=f'{labo}_users_{year}', save=True) 
 
                 # graphics Databases
-                df_stats_number_all_databases = DF_STATS_NUMBER_ALL_DATABASES[(DF_STATS_NUMBER_ALL_DATABASES['year'] == int(year)) & (DF_STATS_NUMBER_ALL_DATABASES["institution_name"] == self.name)]
+                df_stats_number_all_databases = self.context.index_number_databases.rows((self.name, int(year)))
                 if not df_stats_number_all_databases.empty:
                     self.create_graph( df_stats_number_all_databases, year=year, x_var='database_name2', y_var='nb_codes', \
                 color='deeppink', legend_title ="Number of extracted Eurofidai codes", xlabel="Database", ylabel ="Number of codes" , title=f'{labo}_database_{year}', save=True)                   
@@ -452,7 +526,7 @@ class Institution:
     def treat_argument_year(self, argyears: str, labo: str):
 
         if argyears is None:
-                years = self.data[self.data['institution_name'] == labo]['year'].sort_values().unique()
+                years = self.context.index_infos_by_institution.rows(labo)['year'].sort_values().unique()
                 if years is None:
                     print(f"The institution '{labo}' does not have any activities for the year {years}.")
                     sys.exit(1)
@@ -472,7 +546,7 @@ class Institution:
             
             years = list(year_int)            
             self.create_institution_folder()
-            l = [year for year in years if year not in set(self.data['year'].tolist())]
+            l = [year for year in years if year not in self.context.stats_years]
             if l:
                 print(f"The institution '{labo}' does not have any activities for the years {l}.")
                 sys.exit(1)
@@ -486,7 +560,7 @@ class Institution:
             years=[year]
             self.create_institution_folder()
 
-            l = [year for year in years if year not in set(self.data['year'].tolist())]
+            l = [year for year in years if year not in self.context.stats_years]
             if l:
                 print(f"The institution '{labo}' does not have any activities for the years {l}.")
             
@@ -504,12 +578,22 @@ if __name__ == "__main__":
         
     args = parse_arguments()
 
-    if not DF_STATS_INSTITUTIONS_ALL_USERS.empty:
-        all_years = DF_STATS_INSTITUTIONS_ALL_USERS[['year']].drop_duplicates().sort_values(by='year')['year'].tolist()
-        create_seaborn_relplot(DF_STATS_INSTITUTIONS_ALL_USERS, x_var='month2', y_var='nb_users', kind='line', hue ="year", title="Number of Eurofidai's Database Users", legend_labels=all_years, filename="Number of Eurofidai's Database Users", save=True, height=5, aspect=1.5)
+    # the extraction is restricted to the requested years and laboratories, it runs on the first access to the data
+    try:
+        scope_years = [int(year) for year in args.year.split(',')] if args.year else None
+    except ValueError:
+        raise ValueError("The year parameter must be an integer or a list of integers.")
+    scope_labos = args.labo.split(";") if args.labo else None
+    context = get_stats_context(years=scope_years, labos=scope_labos)
+
+    # the graph of all the laboratories covers the full history, it is only drawn by an unscoped run
+    if scope_years is None and scope_labos is None and not context.institutions_all_users.empty:
+        df_institutions_all_users = context.institutions_all_users
+        all_years = df_institutions_all_users[['year']].drop_duplicates().sort_values(by='year')['year'].tolist()
+        create_seaborn_relplot(df_institutions_all_users, x_var='month2', y_var='nb_users', kind='line', hue ="year", title="Number of Eurofidai's Database Users", legend_labels=all_years, filename="Number of Eurofidai's Database Users", save=True, height=5, aspect=1.5)
 
     if args.labo is None:
-        labos = set(DF_STATS_INFOS['labo_name'].tolist())
+        labos = context.labo_names
         for labo in labos:
             c_institution=Institution(name=labo)            
             c_institution.treat_argument_year(args.year, labo)
@@ -529,6 +613,12 @@ if __name__ == "__main__":
         raise ValueError("The labo parameter must be a string or a list of strings separated by ';'.")
                
 
+    report_database_rules()
+
+    # close the shared figure and the pooled yakari connections
+    close_bar_renderer()
+    dispose_engines()
+
     end_time=datetime.datetime.now()
 
     print(f"\nStart time: {start_time}\nEnd time: {end_time}\nDuration: {end_time - start_time}")
\ No newline at end of file
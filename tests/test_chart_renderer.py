@@ -0,0 +1,39 @@
+import pandas as pd
+from utils.ChartRenderer import chart_digest, chart_is_cached, save_chart_digest
+
+
+def make_data() -> pd.DataFrame:
+    return pd.DataFrame({'month2': ['January', 'February'], 'nb_users': [12, 7]})
+
+
+def test_chart_digest_is_stable():
+    assert chart_digest(make_data(), title='Users', year=2024) == chart_digest(make_data(), year=2024, title='Users')
+    # the index is not plotted
+    assert chart_digest(make_data().set_axis([5, 6]), title='Users') == chart_digest(make_data(), title='Users')
+
+
+def test_chart_digest_changes_with_the_data():
+    df = make_data()
+    digest = chart_digest(df, title='Users')
+    changed = df.copy()
+    changed.loc[1, 'nb_users'] = 8
+    assert chart_digest(changed, title='Users') != digest
+    assert chart_digest(df.rename(columns={'nb_users': 'nb_codes'}), title='Users') != digest
+    assert chart_digest(df.astype({'nb_users': 'float64'}), title='Users') != digest
+    assert chart_digest(df.iloc[::-1], title='Users') != digest
+
+
+def test_chart_digest_changes_with_the_params():
+    df = make_data()
+    assert chart_digest(df, title='Users') != chart_digest(df, title='Codes')
+    assert chart_digest(df, title='Users') != chart_digest(df, title='Users', year=2024)
+
+
+def test_chart_is_cached(tmp_path):
+    path = tmp_path / 'users.png'
+    digest = chart_digest(make_data(), title='Users')
+    assert not chart_is_cached(path, digest)
+    path.write_bytes(b'png')
+    save_chart_digest(path, digest)
+    assert chart_is_cached(path, digest)
+    assert not chart_is_cached(path, chart_digest(make_data(), title='Codes'))
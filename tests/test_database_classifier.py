@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+from utils.DatabaseClassifier import (RuleClassifier, DATABASE_NAME2_RULES, CODE_OU_DATA_RULES, like_to_regex,
+                                      classify_database_names)
+
+
+# labels of the former SQL CASE of nom_base_interrogee (database_name2, code_ou_data)
+CASE_RESULTS = [
+    ('histo_actions_fr', 'Stocks', 'Search_Code'),
+    ('actions_fr', 'Stocks', 'Extract_Data'),
+    ('transactions_x', 'Stocks', 'Extract_Data'),
+    ('actions', None, 'Extract_Data'),
+    ('indices_telekurs', 'Global\\Market Indices', 'Extract_Data'),
+    ('histo_indices_telekurs_x', 'Global\\Market Indices', 'Search_Code'),
+    ('indices_eurofidai', 'Eurofidai Indices', 'Extract_Data'),
+    ('histo_indices_eurofidai_x', 'Eurofidai Indices', 'Search_Code'),
+    ('corres_code_isin', 'Code Mapping Table', 'Extract_Data'),
+    ('fonds_mutuel_fr', 'Mutual Funds', 'Extract_Data'),
+    ('fonds_mutuel', None, 'Extract_Data'),
+    ('histo_change', 'Spot Exchange Rate', 'Search_Code'),
+    ('histo_ost', 'Corporate Events', 'Search_Code'),
+    ('ost_fr', 'Corporate Events', 'Extract_Data'),
+    ('cost_fr', None, 'Extract_Data'),
+    ('esg_scores', 'ESG', 'Extract_Data'),
+    ('ESG_scores', None, 'Extract_Data'),
+    ('greenbonds', 'Green Bonds', 'Extract_Data'),
+    ('unknown', None, 'Extract_Data'),
+]
+
+
+def test_classify_matches_case_results():
+    database_name2 = RuleClassifier('database_name2', DATABASE_NAME2_RULES)
+    code_ou_data = RuleClassifier('code_ou_data', CODE_OU_DATA_RULES, default='Extract_Data')
+    for name, label, code in CASE_RESULTS:
+        assert database_name2.classify(name) == label, name
+        assert code_ou_data.classify(name) == code, name
+
+
+def test_missing_names_get_the_default():
+    database_name2 = RuleClassifier('database_name2', DATABASE_NAME2_RULES)
+    code_ou_data = RuleClassifier('code_ou_data', CODE_OU_DATA_RULES, default='Extract_Data')
+    for value in (None, np.nan):
+        assert database_name2.classify(value) is None
+        assert code_ou_data.classify(value) == 'Extract_Data'
+
+
+def test_shadowed_rules():
+    classifier = RuleClassifier('database_name2', DATABASE_NAME2_RULES)
+    assert classifier.shadowed_rules() == [('%histo_indices_telekurs%', 'Global\\Market Indices'),
+                                           ('%histo_indices_eurofidai%', 'IEurofidai Indices')]
+
+
+def test_classify_series_with_missing_names():
+    classifier = RuleClassifier('code_ou_data', CODE_OU_DATA_RULES, default='Extract_Data')
+    names = pd.Series(['histo_actions', None, 'actions_fr', 'histo_actions', np.nan], index=[5, 6, 7, 8, 9])
+    labels = classifier.classify_series(names)
+    assert isinstance(labels.dtype, pd.CategoricalDtype)
+    assert list(labels.index) == [5, 6, 7, 8, 9]
+    assert list(labels) == ['Search_Code', 'Extract_Data', 'Extract_Data', 'Search_Code', 'Extract_Data']
+
+
+def test_classify_database_names_objects():
+    df = pd.DataFrame({'database_name': ['histo_indices_telekurs', None, 'esg']})
+    df = classify_database_names(df, categorical=False)
+    assert list(df['database_name2']) == ['Global\\Market Indices', None, 'ESG']
+    assert list(df['code_ou_data']) == ['Search_Code', 'Extract_Data', 'Extract_Data']
+
+
+def test_like_to_regex():
+    assert like_to_regex('%actions_%').fullmatch('actions_x')
+    assert like_to_regex('%actions_%').fullmatch('actionsX')
+    assert not like_to_regex('%actions_%').fullmatch('actions')
+    assert like_to_regex('ost%').fullmatch('ost')
+    assert not like_to_regex('ost%').fullmatch('cost')
+    assert like_to_regex('a.b%').fullmatch('a.bc')
+    assert not like_to_regex('a.b%').fullmatch('axbc')
@@ -0,0 +1,41 @@
+import pandas as pd
+from src.oop_daily_users_stats import FrameIndex
+
+
+def make_infos() -> pd.DataFrame:
+    return pd.DataFrame({
+        'id_user': [1, 2, 1, 3],
+        'labo_name': ['IAE Lille', ' iae lille ', 'HEC', 'HEC'],
+        'database_name2': ['Stocks', 'ESG', 'Stocks ', 'ESG'],
+        'year': [2024, 2024, 2025, 2024],
+    }, index=[10, 11, 12, 13])
+
+
+def test_normalized_lookup():
+    index = FrameIndex(make_infos(), 'labo_name', normalized=True)
+    assert sorted(index.keys()) == ['hec', 'iae lille']
+    assert 'IAE LILLE ' in index
+    rows = index.rows(' Iae Lille')
+    assert list(rows.index) == [10, 11]
+    assert index.values('iae lille', 'id_user') == [1, 2]
+    assert index.values('HEC', 'database_name2') == ['Stocks ', 'ESG']
+
+
+def test_exact_lookup_is_not_normalized():
+    index = FrameIndex(make_infos(), 'labo_name')
+    assert 'IAE Lille' in index
+    assert 'iae lille' not in index
+    assert list(index.rows(' iae lille ').index) == [11]
+
+
+def test_lookup_on_several_keys():
+    index = FrameIndex(make_infos(), ['labo_name', 'year'])
+    assert list(index.rows(('HEC', 2024)).index) == [13]
+    assert ('HEC', 2023) not in index
+
+
+def test_unknown_key_returns_empty_rows():
+    infos = make_infos()
+    rows = FrameIndex(infos, 'id_user').rows(42)
+    assert rows.empty
+    assert list(rows.columns) == list(infos.columns)
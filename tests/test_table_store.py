@@ -0,0 +1,49 @@
+import pandas as pd
+import pytest
+from utils.TableStore import TableWriter, read_table, table_columns, write_table
+
+
+def make_chunk(ids, labos) -> pd.DataFrame:
+    return pd.DataFrame({
+        'id_user': pd.Series(ids, dtype='int32'),
+        'labo_name': pd.Series(labos, dtype='category'),
+        'date_heure_extraction': pd.to_datetime(['2024-01-02'] * len(ids)),
+    })
+
+
+@pytest.mark.parametrize('table_format', ['csv', 'parquet'])
+def test_table_writer_append_round_trip(tmp_path, table_format):
+    with TableWriter(tmp_path / 'raw_data', table_format) as writer:
+        writer.write(make_chunk([1, 2], ['IAE Lille', 'HEC']))
+        # other categories, then only missing labels: the chunks must share the schema of the first one
+        writer.write(make_chunk([3], [None]))
+    with TableWriter(tmp_path / 'raw_data', table_format, append=True) as writer:
+        writer.write(make_chunk([4], ['ESSEC']))
+    assert writer.rows == 1
+
+    df = read_table(writer.path)
+    assert writer.path.name == f'raw_data.{table_format}'
+    assert df['id_user'].tolist() == [1, 2, 3, 4]
+    assert df['labo_name'].tolist()[:2] == ['IAE Lille', 'HEC']
+    assert pd.isna(df['labo_name'].iloc[2])
+    assert df['labo_name'].iloc[3] == 'ESSEC'
+    assert table_columns(writer.path) == ['id_user', 'labo_name', 'date_heure_extraction']
+
+
+def test_parquet_keeps_the_dtypes(tmp_path):
+    with TableWriter(tmp_path / 'raw_data', 'parquet') as writer:
+        writer.write(make_chunk([1], ['HEC']))
+        writer.write(make_chunk([2], ['IAE Lille']))
+    df = read_table(writer.path, columns=['id_user', 'date_heure_extraction', 'missing'])
+    assert list(df.columns) == ['id_user', 'date_heure_extraction']
+    assert str(df['id_user'].dtype) == 'int32'
+    assert pd.api.types.is_datetime64_any_dtype(df['date_heure_extraction'])
+
+
+def test_write_table_keeps_an_unchanged_file(tmp_path):
+    df = make_chunk([1, 2], ['IAE Lille', 'HEC'])
+    path = write_table(df, tmp_path / 'stats', 'csv')
+    inode = path.stat().st_ino
+    assert write_table(df, tmp_path / 'stats.csv', 'csv') == path
+    assert path.stat().st_ino == inode
+    assert not list(tmp_path.glob('*.tmp'))
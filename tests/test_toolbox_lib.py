@@ -0,0 +1,44 @@
+import pandas as pd
+from utils.Toolbox_lib import year_range_condition, match_institutions
+
+
+def test_year_range_condition_single_year():
+    assert year_range_condition(2024) == "(date_heure_extraction >= '2024-01-01' AND date_heure_extraction < '2025-01-01')"
+
+
+def test_year_range_condition_merges_consecutive_years():
+    condition = year_range_condition("2025,2023,2024", column="d")
+    assert condition == "(d >= '2023-01-01' AND d < '2026-01-01')"
+    assert year_range_condition([2023, "2024", 2024], column="d") == "(d >= '2023-01-01' AND d < '2025-01-01')"
+
+
+def test_year_range_condition_keeps_gaps():
+    condition = year_range_condition([2020, 2022, 2023], column="d")
+    assert condition == "((d >= '2020-01-01' AND d < '2021-01-01') OR (d >= '2022-01-01' AND d < '2024-01-01'))"
+
+
+def test_year_range_condition_without_years():
+    assert year_range_condition(None, column="d", start_year=2021) == "d >= '2021-01-01'"
+    assert year_range_condition([], column="d") == "d >= '2020-01-01'"
+
+
+def test_match_institutions_searches_every_label_column():
+    df = pd.DataFrame({
+        'labo_name': ['IAE Lille ', 'Finance lab', 'other', None],
+        'institution_name': ['Université de Lille', ' HEC Paris', 'none', 'hec'],
+        'comment': ['', 'iae lille', 'iae lille', ''],
+    }, index=[10, 11, 12, 13])
+    masks = match_institutions(df, ['iae lille', 'hec', 'essec'])
+    assert set(masks) == {'iae lille', 'hec'}
+    # the comment column is not a label column
+    assert list(masks['iae lille']) == [True, False, False, False]
+    assert list(masks['hec']) == [False, True, False, True]
+    assert list(masks['hec'].index) == [10, 11, 12, 13]
+
+
+def test_match_institutions_without_label_columns():
+    df = pd.DataFrame({'name': ['ESSEC Business School', 'HEC']})
+    masks = match_institutions(df, ['essec'])
+    assert list(masks['essec']) == [True, False]
+    assert match_institutions(df, []) == {}
+    assert match_institutions(df, ['iae lille']) == {}
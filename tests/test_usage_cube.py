@@ -0,0 +1,43 @@
+import pandas as pd
+from utils.UsageCube import UsageCube
+
+
+def make_cube() -> UsageCube:
+    df = pd.DataFrame({
+        'institution_name': ['IAE Lille', 'IAE Lille', 'IAE Lille', 'HEC'],
+        'user_name': ['alice', 'bob', 'alice', 'carol'],
+        'database_name2': ['Stocks', 'ESG', 'Stocks', 'Stocks'],
+        'type_interrogation2': ['téléchargement'] * 4,
+        'year': [2024, 2024, 2025, 2024],
+        'month': [1, 2, 1, 3],
+        'nb_codes': [10, 5, 7, 3],
+    })
+    return UsageCube(df)
+
+
+def test_subcube_list_filter_with_missing_value():
+    cube = make_cube()
+    subcube = cube.subcube(year=[2024, 2030])
+    assert len(subcube) == 3
+    assert subcube.values('year') == [2024]
+
+
+def test_slice_missing_values_only_is_empty():
+    cube = make_cube()
+    assert cube.slice(year=[2030]).empty
+    assert cube.slice(institution_name='Unknown').empty
+
+
+def test_rollup_with_filters():
+    cube = make_cube()
+    df = cube.rollup(['year'], institution_name=['IAE Lille', 'Unknown'])
+    assert df.set_index('year')['nb_codes'].to_dict() == {2024: 15, 2025: 7}
+    assert df.set_index('year')['nb_users'].to_dict() == {2024: 2, 2025: 1}
+
+
+def test_slice_filters_on_leading_and_inner_dimensions():
+    cube = make_cube()
+    df = cube.slice(institution_name='IAE Lille', year=2024, month=[1, 2, 12])
+    assert sorted(df['user_name']) == ['alice', 'bob']
+    assert df['nb_codes'].sum() == 15
+    assert cube.slice(institution_name='HEC', year=2025).empty
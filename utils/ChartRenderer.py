@@ -0,0 +1,128 @@
+"""
+This script renders the bar charts of the daily users statistics.
+Typical usage example:
+
+    renderer = get_bar_renderer()
+    renderer.bar_chart(df, x_var='month2', y_var='nb_codes', color='lightsteelblue', title='IAE Lille(2024)',
+                       path=Path('IAE Lille_2024.png'))
+    close_bar_renderer()
+
+----
+The style and the fonts are applied once, one Figure/Axes is cleared and reused for every chart
+and the figure is closed by close() / close_bar_renderer(), so the memory stays flat over hundreds of charts.
+The render cache (chart_digest, chart_is_cached, save_chart_digest) skips the charts whose data and parameters did not
+change since the image was saved: the sha256 of both is kept next to the image in <image>.sha256.
+"""
+import hashlib
+from pathlib import Path
+import pandas as pd
+import matplotlib.pyplot as plt
+from matplotlib.ticker import MultipleLocator
+
+
+# to be increased when the drawing code changes, so the cached charts are drawn again
+RENDER_VERSION = 1
+
+
+def chart_digest(df: pd.DataFrame, **params) -> str:
+    """ Return the sha256 of the plotted data (values, columns and dtypes of df) and of the chart parameters. """
+    digest = hashlib.sha256()
+    digest.update(repr((RENDER_VERSION, list(df.columns), [str(dtype) for dtype in df.dtypes], sorted(params.items()))).encode('utf-8'))
+    digest.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+    return digest.hexdigest()
+
+
+def chart_digest_path(path: Path) -> Path:
+    path = Path(path)
+    return path.with_name(path.name + '.sha256')
+
+
+def chart_is_cached(path: Path, digest: str) -> bool:
+    """ True if the image path exists and was saved from the data and parameters of digest. """
+    digest_path = chart_digest_path(path)
+    return Path(path).exists() and digest_path.exists() and digest_path.read_text().strip() == digest
+
+
+def save_chart_digest(path: Path, digest: str) -> None:
+    """ Record the digest of the image path, once the image is saved. """
+    chart_digest_path(path).write_text(digest)
+
+
+def get_multiple_locator(n: int) -> int:
+    """ This function returns the multiple locator for the y-axis based on the number of digits in the number.
+    For example, if the number is 1250, it returns 1000, if the number is 158, it returns 100, and so on."""
+    magnitude = 0   
+    while n >= 10:
+        n //= 10
+        magnitude += 1    
+
+    multiple = {0:10, 1:10, 2:100, 3:1000, 4:10000, 5:100000,6:1000000,7:10000000,8:100000000,9:1000000000}
+    return multiple[magnitude]
+
+
+class BarChartRenderer:
+    def __init__(self, figsize: tuple = (12, 8), style: str = 'seaborn-v0_8-dark-palette', font: dict = None):
+        plt.style.use(style)
+        plt.rc('font', **(font or {'size': 12, 'family': 'Arial', 'weight': 'normal'}))  # Set font properties
+        self.fig, self.ax = plt.subplots(figsize=figsize)
+
+    def __repr__(self):
+        return f"BarChartRenderer(fig={self.fig})"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def bar_chart(self, df: pd.DataFrame, x_var: str, y_var: str, color: str, title: str, legend_title: str = None,
+                  legend_label: str = None, xlabel: str = None, ylabel: str = None, path: Path = None) -> None:
+        """ Draw a bar chart of y_var per x_var on the reused axes and save it to path if given. """
+        ax = self.ax
+        ax.clear()  # remove the artists of the previous chart
+        ax.spines[['bottom', 'top', 'right']].set_visible(True)
+        bc = ax.bar(df[x_var], df[y_var], color=color)  # barh for horizontal
+        ax.tick_params(axis='x', rotation=70, labelsize=10)  # Rotate x-axis labels
+
+        ax.bar_label(bc, labels=df[y_var], padding=30, fmt='%s', fontsize=10)  # fmt='%s' for string labels
+
+        # Add custom legend if needed
+        ax.legend(title=legend_title, loc='upper right', labels=[legend_label])
+        ax.set_xlabel(xlabel, fontsize=14, loc='center', fontweight='bold')
+        ax.set_ylabel(ylabel, fontsize=14, loc='center', fontweight='bold')
+        ax.set_title(title, fontsize=20, fontweight='bold', backgroundcolor='lightgrey', loc='center', pad=15)
+
+        max_value = df[y_var].max()
+        if max_value <= 100:   # Set y-axis limits
+            ax.set_ylim(0, max_value + 10)
+        elif max_value <= 50000:
+            ax.set_ylim(0, max_value + max_value*0.5)
+        elif max_value > 50000:
+            ax.set_ylim(0, max_value + max_value*0.35)
+
+        ax.yaxis.set_major_locator(MultipleLocator(get_multiple_locator(max_value)))
+
+        self.fig.tight_layout()  # Adjust subplot parameters to give specified padding
+        if path is not None:
+            self.fig.savefig(str(path), bbox_inches='tight')  # Ensure all elements are included
+
+    def close(self) -> None:
+        plt.close(self.fig)
+
+
+# one renderer per process, created on first use
+RENDERER = None
+
+
+def get_bar_renderer() -> BarChartRenderer:
+    global RENDERER
+    if RENDERER is None:
+        RENDERER = BarChartRenderer()
+    return RENDERER
+
+
+def close_bar_renderer() -> None:
+    global RENDERER
+    if RENDERER is not None:
+        RENDERER.close()
+        RENDERER = None
@@ -0,0 +1,125 @@
+"""
+This script classifies the queried databases of statistique_requete (nom_base_interrogee) for every stats script.
+Typical usage example:
+
+    df_stats_daily_users = classify_database_names(df_stats_daily_users)
+    report_database_rules()
+
+----
+The rules are the LIKE patterns of the former SQL CASE (database_name2 and code_ou_data), tried in the same order:
+the first matching rule gives the label. They are compiled once to regular expressions.
+Each distinct database name is classified once (memoized across the chunks of an extraction) and the labels are
+broadcast to the rows through the codes of pd.factorize, instead of evaluating the patterns on every row.
+report() prints the rules shadowed by an earlier rule and the rules which matched none of the classified names.
+"""
+import re
+import numpy as np
+import pandas as pd
+
+
+# (LIKE pattern, label) in the order of the SQL CASE
+DATABASE_NAME2_RULES = [
+    ('%histo_actions%', 'Stocks'),
+    ('%actions_%', 'Stocks'),
+    ('%indices_telekurs%', 'Global\\Market Indices'),
+    ('%histo_indices_telekurs%', 'Global\\Market Indices'),
+    ('%indices_eurofidai%', 'Eurofidai Indices'),
+    ('%histo_indices_eurofidai%', 'IEurofidai Indices'),
+    ('%corres_code%', 'Code Mapping Table'),
+    ('%fonds_mutuel_%', 'Mutual Funds'),
+    ('%change%', 'Spot Exchange Rate'),
+    ('%histo_ost%', 'Corporate Events'),
+    ('ost%', 'Corporate Events'),
+    ('%esg%', 'ESG'),
+    ('%greenbonds%', 'Green Bonds'),
+]
+
+CODE_OU_DATA_RULES = [('%histo%', 'Search_Code')]
+
+
+def like_to_regex(pattern: str) -> re.Pattern:
+    """ Compile a SQL LIKE pattern ('%' any string, '_' any character, case sensitive) to a regex to fullmatch. """
+    regex = ''.join('.*' if char == '%' else '.' if char == '_' else re.escape(char) for char in pattern)
+    return re.compile(regex, re.DOTALL)
+
+
+class RuleClassifier:
+    """ Ordered LIKE rules (pattern, label): a name gets the label of its first matching rule, default otherwise
+    (like the ELSE of a CASE, also used for the missing names). """
+    def __init__(self, name: str, rules: list, default: str = None):
+        self.name = name
+        self.rules = list(rules)
+        self.default = default
+        self._patterns = [like_to_regex(pattern) for pattern, _ in self.rules]
+        self._memo = {}
+        # number of distinct names matched by each rule
+        self.hits = [0] * len(self.rules)
+
+    def __repr__(self):
+        return f"RuleClassifier(name={self.name}, rules={len(self.rules)}, names={len(self._memo)})"
+
+    def classify(self, value) -> str:
+        """ Return the label of a name (memoized). """
+        if not isinstance(value, str):
+            return self.default
+        if value not in self._memo:
+            label = self.default
+            for i, pattern in enumerate(self._patterns):
+                if pattern.fullmatch(value):
+                    self.hits[i] += 1
+                    label = self.rules[i][1]
+                    break
+            self._memo[value] = label
+        return self._memo[value]
+
+    def classify_series(self, names: pd.Series, categorical: bool = True) -> pd.Series:
+        """ Return the labels of names (a categorical Series, object if categorical is False).
+        Only the distinct names are classified, the rows get their label through the factorize codes. """
+        codes, uniques = pd.factorize(names)
+        labels = [self.classify(value) for value in uniques]
+        categories = sorted({label for label in labels if label is not None})
+        position = {label: i for i, label in enumerate(categories)}
+        # the last code is the label of the missing names (factorize code -1)
+        label_codes = np.array([position.get(label, -1) for label in labels] + [position.get(self.default, -1)])
+        result = pd.Series(pd.Categorical.from_codes(label_codes[codes], categories=categories), index=names.index)
+        return result if categorical else result.astype(object).where(result.notna(), None)
+
+    def shadowed_rules(self) -> list:
+        """ Return the rules which can never match because an earlier rule matches their pattern
+        (checked on the text of the pattern, e.g. '%indices_eurofidai%' before '%histo_indices_eurofidai%'). """
+        shadowed = []
+        for j, (pattern, label) in enumerate(self.rules):
+            text = pattern.replace('%', '')
+            if any(self._patterns[i].fullmatch(text) for i in range(j)):
+                shadowed.append((pattern, label))
+        return shadowed
+
+    def unmatched_rules(self) -> list:
+        """ Return the rules which matched none of the names classified so far. """
+        return [rule for rule, hits in zip(self.rules, self.hits) if hits == 0]
+
+    def report(self) -> None:
+        shadowed = self.shadowed_rules()
+        for pattern, label in shadowed:
+            print(f"{self.name}: the rule {pattern} -> {label} is shadowed by an earlier rule and can never match")
+        for pattern, label in self.unmatched_rules():
+            if (pattern, label) not in shadowed:
+                print(f"{self.name}: the rule {pattern} -> {label} matched none of the {len(self._memo)} database names")
+
+
+DATABASE_NAME2_CLASSIFIER = RuleClassifier('database_name2', DATABASE_NAME2_RULES)
+CODE_OU_DATA_CLASSIFIER = RuleClassifier('code_ou_data', CODE_OU_DATA_RULES, default='Extract_Data')
+
+
+def classify_database_names(df: pd.DataFrame, column: str = 'database_name', categorical: bool = True) -> pd.DataFrame:
+    """ Add the database_name2 and code_ou_data columns of the database names of column to df and return df.
+    With categorical=False the labels are strings (scripts which group by them without observed=True). """
+    df['database_name2'] = DATABASE_NAME2_CLASSIFIER.classify_series(df[column], categorical)
+    df['code_ou_data'] = CODE_OU_DATA_CLASSIFIER.classify_series(df[column], categorical)
+    return df
+
+
+def report_database_rules() -> None:
+    """ Print the classification rules which never matched (see RuleClassifier.report). """
+    for classifier in (DATABASE_NAME2_CLASSIFIER, CODE_OU_DATA_CLASSIFIER):
+        classifier.report()
@@ -0,0 +1,232 @@
+"""
+This script writes and reads the intermediate stats tables in a pluggable file format.
+Typical usage example:
+
+    path = write_table(df, Path(CHEMIN_INPUT_CSV, 'stats_all_users_with_subscription_informations'), 'parquet')
+    df = read_table(path, columns=['id_user', 'labo_name', 'statut'])
+
+----
+'csv' is the historical pipe separated format, 'parquet' and 'feather' are columnar formats (pyarrow) which keep the
+dtypes (dates, ints) and only read the projected columns.
+Chunked extractions are written with a TableWriter: CSV chunks are appended, Parquet chunks are row groups of one file,
+Feather chunks are concatenated and written when the writer is closed.
+The files are written once through a temp file and a rename, left untouched when their content is unchanged, and
+published in a second folder by hardlink (copy between file systems) instead of being serialized again.
+"""
+import io
+import os
+import shutil
+import hashlib
+from pathlib import Path
+import pandas as pd
+
+
+# file suffix of each supported format
+TABLE_FORMATS = {'csv': '.csv', 'parquet': '.parquet', 'feather': '.feather'}
+CSV_SEP = '|'
+
+
+def table_path(path: Path, table_format: str = 'csv') -> Path:
+    """ Return path with the suffix of table_format (the table name can be given with or without suffix). """
+    if table_format not in TABLE_FORMATS:
+        raise ValueError(f"Unknown table format {table_format}, expected one of {list(TABLE_FORMATS)}")
+    path = Path(path)
+    if path.suffix in TABLE_FORMATS.values():
+        path = path.with_suffix('')
+    return path.with_name(path.name + TABLE_FORMATS[table_format])
+
+
+def table_format_of(path: Path) -> str:
+    """ Return the format of a table file from its suffix. """
+    for table_format, suffix in TABLE_FORMATS.items():
+        if Path(path).suffix == suffix:
+            return table_format
+    raise ValueError(f"Unknown table format for {path}, expected one of {list(TABLE_FORMATS.values())}")
+
+
+def serialize_table(df: pd.DataFrame, table_format: str = 'csv') -> bytes:
+    """ Return the content of the table file of df in table_format. """
+    if table_format == 'csv':
+        return df.to_csv(index=False, sep=CSV_SEP).encode('utf-8')
+    if table_format == 'parquet':
+        return df.to_parquet(index=False)
+    buffer = io.BytesIO()
+    df.reset_index(drop=True).to_feather(buffer)
+    return buffer.getvalue()
+
+
+def file_digest(path: Path) -> str:
+    """ Return the sha256 of a file, read by blocks of 1 MB. """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def replace_if_changed(tmp_path: Path, path: Path) -> bool:
+    """ Rename tmp_path to path (atomic on the same file system), unless path already has the same content:
+    tmp_path is then removed and path keeps its inode and mtime. Returns True if path was replaced. """
+    if path.exists() and file_digest(path) == file_digest(tmp_path):
+        tmp_path.unlink()
+        return False
+    os.replace(tmp_path, path)
+    return True
+
+
+def link_or_copy(path: Path, link_path: Path) -> Path:
+    """ Publish the file path at link_path with a hardlink (a copy if path and link_path are on different file systems).
+    link_path is replaced atomically, nothing is done if it is already a link to path. """
+    link_path = Path(link_path)
+    if link_path.exists() and os.path.samefile(path, link_path):
+        return link_path
+    tmp_path = link_path.with_name(link_path.name + '.tmp')
+    tmp_path.unlink(missing_ok=True)
+    try:
+        os.link(path, tmp_path)
+    except OSError:
+        shutil.copy2(path, tmp_path)
+    os.replace(tmp_path, link_path)
+    return link_path
+
+
+def write_table(df: pd.DataFrame, path: Path, table_format: str = 'csv', links: list = ()) -> Path:
+    """ Write df to path in table_format and return the path of the written file.
+    The table is serialized once, written through a temp file renamed over path (skipped if the content of path is
+    unchanged) and published in each folder of links (same file name) by hardlink. """
+    path = table_path(path, table_format)
+    tmp_path = path.with_name(path.name + '.tmp')
+    tmp_path.write_bytes(serialize_table(df, table_format))
+    replace_if_changed(tmp_path, path)
+    for folder in links:
+        link_or_copy(path, Path(folder, path.name))
+    return path
+
+
+def arrow_schema(df: pd.DataFrame):
+    """ Return the Arrow schema of df shared by every chunk of a table: the category columns are strings, whatever
+    the categories (or the nulls) of the chunk used (Parquet dictionary-encodes the repeated strings itself). """
+    import pyarrow as pa
+    schema = pa.Schema.from_pandas(df, preserve_index=False)
+    for col in df.columns:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            schema = schema.set(schema.get_field_index(col), pa.field(col, pa.string()))
+    return schema
+
+
+def decategorize(df: pd.DataFrame) -> pd.DataFrame:
+    """ Return df with its category columns as object (string) columns. """
+    categories = [col for col in df.columns if isinstance(df[col].dtype, pd.CategoricalDtype)]
+    return df.astype({col: object for col in categories}) if categories else df
+
+
+def read_table(path: Path, columns: list = None) -> pd.DataFrame:
+    """ Read a table file written by write_table, only the columns of columns which exist in the file if given. """
+    path = Path(path)
+    table_format = table_format_of(path)
+    if table_format == 'csv':
+        usecols = (lambda col: col in columns) if columns is not None else None
+        return pd.read_csv(path, delimiter=CSV_SEP, usecols=usecols)
+
+    if columns is not None:
+        columns = [col for col in columns if col in table_columns(path)]
+    if table_format == 'parquet':
+        return pd.read_parquet(path, columns=columns)
+    return pd.read_feather(path, columns=columns)
+
+
+def table_columns(path: Path) -> list:
+    """ Return the column names of a table file without reading its rows. """
+    path = Path(path)
+    table_format = table_format_of(path)
+    if table_format == 'csv':
+        return pd.read_csv(path, delimiter=CSV_SEP, nrows=0).columns.tolist()
+    if table_format == 'parquet':
+        import pyarrow.parquet as pq
+        return pq.read_schema(path).names
+    import pyarrow as pa
+    with pa.memory_map(str(path)) as source:
+        return pa.ipc.open_file(source).schema.names
+
+
+def list_tables(folder_path: Path, table_format: str = 'csv') -> list:
+    """ Return the file names of the tables of folder_path in table_format. """
+    suffix = TABLE_FORMATS[table_format]
+    return sorted(file for file in os.listdir(folder_path) if file.endswith(suffix))
+
+
+class TableWriter:
+    """ Write a table chunk by chunk (streamed extraction) in table_format.
+    The chunks are written to a temp file which replaces path on close() (kept if the content is unchanged),
+    then path is published in each folder of links by hardlink, like write_table.
+    With append=True the chunks are added to the rows of the existing file (previous runs). """
+    def __init__(self, path: Path, table_format: str = 'csv', append: bool = False, links: list = ()):
+        self.path = table_path(path, table_format)
+        self.table_format = table_format
+        self.links = [Path(folder, self.path.name) for folder in links]
+        self.append = append and self.path.exists()
+        self.rows = 0
+        self._started = False
+        self._chunks = []
+        self._writer = None
+        self._tmp_path = self.path.with_name(self.path.name + '.tmp')
+        self._tmp_path.unlink(missing_ok=True)
+        if self.append:
+            if table_format == 'csv':
+                # a copy, so the published links of the previous file are not modified
+                shutil.copyfile(self.path, self._tmp_path)
+                self._started = True
+            else:
+                # the columnar files cannot be appended in place, the previous rows are rewritten first
+                self.write(read_table(self.path))
+                self.rows = 0
+
+    def __repr__(self):
+        return f"TableWriter(path={self.path}, format={self.table_format}, rows={self.rows})"
+
+    def write(self, df: pd.DataFrame) -> None:
+        if self.table_format == 'csv':
+            # the first chunk creates the file, the next ones are appended
+            mode, header = ('a', False) if self._started else ('w', True)
+            df.to_csv(str(self._tmp_path), mode=mode, header=header, index=False, encoding='utf-8', sep=CSV_SEP)
+        elif self.table_format == 'parquet':
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            if self._writer is None:
+                # every row group has the schema of the first chunk, the category columns as strings
+                self._writer = pq.ParquetWriter(self._tmp_path, arrow_schema(df))
+            table = pa.Table.from_pandas(decategorize(df), schema=self._writer.schema, preserve_index=False)
+            self._writer.write_table(table)
+        else:
+            self._chunks.append(df)
+        self._started = True
+        self.rows += len(df)
+
+    def close(self) -> Path:
+        """ Finish the file, publish it at the links and return its path. """
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        elif self.table_format == 'feather' and self._chunks:
+            pd.concat(self._chunks, ignore_index=True).to_feather(self._tmp_path)
+            self._chunks = []
+        if not self._tmp_path.exists():
+            # nothing was written
+            return self.path
+        replace_if_changed(self._tmp_path, self.path)
+        for link in self.links:
+            link_or_copy(self.path, link)
+        return self.path
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+            return
+        # the previous file is kept if the extraction fails
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        self._tmp_path.unlink(missing_ok=True)
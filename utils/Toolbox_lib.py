@@ -139,6 +139,98 @@ def load_csv_data_to_dataframe(csv_folder_path, tablename:str, pattern: str = '*
     else:
         raise ValueError(f"Error reading csv file {file_template}")
 
+def year_range_condition(years=None, column: str = "date_heure_extraction", start_year: int = 2020) -> str:
+    """
+    Build a SQL condition selecting a year or a list of years on a timestamp column.
+    The years are written as half-open ranges (column >= 'YYYY-01-01' AND column < 'YYYY+1-01-01') instead of
+    date_part('year', column), so PostgreSQL can use an index on the column. Consecutive years share one range.
+    years: an int, a list of int/str or a string "2023,2024". Without years, returns column >= 'start_year-01-01'.
+    """
+    if isinstance(years, str):
+        years = years.split(',')
+    elif isinstance(years, int):
+        years = [years]
+    if not years:
+        return f"{column} >= '{int(start_year)}-01-01'"
+
+    # int() also guarantees that only digits end up in the SQL string
+    ranges = []
+    for year in sorted({int(year) for year in years}):
+        if ranges and ranges[-1][1] == year:
+            ranges[-1][1] = year + 1
+        else:
+            ranges.append([year, year + 1])
+
+    conditions = [f"({column} >= '{start}-01-01' AND {column} < '{end}-01-01')" for start, end in ranges]
+    if len(conditions) == 1:
+        return conditions[0]
+    return "(" + " OR ".join(conditions) + ")"
+
+
+# English month names of the reports (the same names as the month2 column of the SQL queries)
+MONTH_NAMES = {1: 'January', 2: 'February', 3: 'March', 4: 'April', 5: 'May', 6: 'June', 7: 'July',
+               8: 'August', 9: 'September', 10: 'October', 11: 'November', 12: 'December'}
+
+
+# dtypes of the statistique_requete extraction: the repetitive labels as category (one code per row instead of
+# a Python string), the date parts and the counters as small integers instead of the float64 of date_part
+STATS_DAILY_USERS_SCHEMA = {
+    'institution_name': 'category', 'user_name': 'category', 'database_name': 'category', 'month2': 'category',
+    'type_interrogation2': 'category', 'database_name2': 'category', 'code_ou_data': 'category', 'month_name': 'category',
+    'id_user': 'int32', 'id_labo': 'int32', 'type_interrogation': 'int8', 'year': 'int16', 'month': 'int8', 'nb_codes': 'int32',
+}
+
+# dtypes of the subscription extraction (users_field_data), id_user has the dtype of the extraction for the merges
+STATS_SUBSCRIPTION_SCHEMA = {'id_user': 'int32', 'labo_name': 'category', 'statut': 'category'}
+
+
+def apply_schema(df: pd.DataFrame, schema: dict) -> pd.DataFrame:
+    """
+    Cast the columns of df listed in schema {column: dtype} (the other columns are left unchanged) and return df.
+    An integer column with missing values gets the nullable dtype (e.g. 'Int32' for 'int32').
+    The groupby on the category columns must be called with observed=True (only the existing combinations).
+    """
+    for col, dtype in schema.items():
+        if col not in df.columns or str(df[col].dtype) == dtype:
+            continue
+        if dtype != 'category' and df[col].isna().any():
+            dtype = dtype.capitalize()
+        df[col] = df[col].astype(dtype)
+    return df
+
+
+# columns holding the institution names in the daily users stats CSV files
+INSTITUTION_LABEL_COLUMNS = ['labo_name', 'institution_name']
+
+
+def match_institutions(df: pd.DataFrame, institution_list: list, label_columns: list = INSTITUTION_LABEL_COLUMNS) -> dict:
+    """
+    Find the rows of df containing each institution of institution_list (names already lower-case and stripped).
+    The label columns are normalized once (.str.lower().str.strip()) and searched with vectorized string operations:
+    one compiled regex of all the institutions selects the candidate rows, then a substring search splits them
+    between the institutions. If df has none of the label columns, every column is searched.
+    Returns {institution: boolean mask over df.index} for the institutions found in df.
+    """
+    if not len(institution_list) or df.empty:
+        return {}
+
+    columns = [col for col in label_columns if col in df.columns] or list(df.columns)
+    values = [df[col].astype(str).str.lower().str.strip() for col in columns]
+
+    pattern = re.compile("|".join(re.escape(institution) for institution in institution_list))
+    any_match = pd.concat([column_values.str.contains(pattern) for column_values in values], axis=1).any(axis=1)
+    if not any_match.any():
+        return {}
+
+    candidate_values = [column_values[any_match] for column_values in values]
+    masks = {}
+    for institution in institution_list:
+        mask = pd.concat([column_values.str.contains(institution, regex=False) for column_values in candidate_values], axis=1).any(axis=1)
+        if mask.any():
+            masks[institution] = mask.reindex(df.index, fill_value=False)
+    return masks
+
+
 """
 Function to create a calendar dataframe
 input: date_debut, date_fin, fréquence
@@ -0,0 +1,129 @@
+"""
+This script materializes the usage counters of the statistique_requete extraction in a cube.
+Typical usage example:
+
+    cube = UsageCube(df_stats_daily_users)
+    df_lille = cube.slice(institution_name='IAE Lille', year=[2024, 2025])
+    df_per_month = cube.rollup(['year', 'month'], institution_name='IAE Lille')
+
+----
+The cube holds one cell per distinct value of its dimensions (by default institution, user, database_name2,
+type_interrogation2, year, month) with the sum of nb_codes and the number of extraction rows.
+The user is a dimension of the cube, so the distinct users of any slice are counted exactly from its cells.
+As a consequence the cube has about as many cells as the distinct extraction rows without their dates: it saves
+the repeated groupbys of the reports on the raw rows, it does not make the data much smaller.
+The cells are sorted by the codes of their MultiIndex levels: a filter on the leading dimensions is a binary search
+(see _locate), a filter on an inner dimension only enumerates the runs of the dimensions before it.
+Cubes of successive chunks are merged with merge() (the counters are additive).
+"""
+import numpy as np
+import pandas as pd
+
+
+CUBE_DIMENSIONS = ['institution_name', 'user_name', 'database_name2', 'type_interrogation2', 'year', 'month']
+CUBE_MEASURES = ['nb_codes', 'nb_events']
+
+
+class UsageCube:
+    def __init__(self, df: pd.DataFrame = None, dimensions: list = CUBE_DIMENSIONS, user_dimensions: list = ['user_name'],
+                 cells: pd.DataFrame = None):
+        """ Build the cube of the raw extraction rows df (a 'nb_codes' column and the dimensions columns),
+        or wrap cells already aggregated (a DataFrame indexed by the dimensions with the CUBE_MEASURES columns).
+        user_dimensions are the dimensions identifying a user (e.g. ['institution_name', 'user_name']). """
+        self.dimensions = list(dimensions)
+        self.user_dimensions = list(user_dimensions)
+        if cells is None:
+            if df is None:
+                df = pd.DataFrame(columns=self.dimensions + ['nb_codes'])
+            missing = [col for col in self.dimensions + ['nb_codes'] if col not in df.columns]
+            if missing:
+                raise ValueError(f"Missing columns to build the cube: {missing}")
+            # dropna=False: the rows without user or database are kept in the totals
+            # the sums are int64 whatever the dtype of nb_codes (int32 in STATS_DAILY_USERS_SCHEMA)
+            df = df.assign(nb_codes=df['nb_codes'].astype('int64'))
+            cells = df.groupby(self.dimensions, dropna=False, observed=True).agg(nb_codes=('nb_codes', 'sum'),
+                                                                              nb_events=('nb_codes', 'size'))
+        if not isinstance(cells.index, pd.MultiIndex):
+            # groupby on a single dimension gives a flat index
+            cells.index = pd.MultiIndex.from_arrays([cells.index], names=self.dimensions)
+        # sorted by the codes of the levels (missing values first), the order searched by _locate
+        self.cells = cells.iloc[np.lexsort(cells.index.codes[::-1])]
+
+    def __repr__(self):
+        return f"UsageCube(dimensions={self.dimensions}, cells={len(self.cells)})"
+
+    def __len__(self):
+        return len(self.cells)
+
+    def merge(self, other: 'UsageCube') -> 'UsageCube':
+        """ Return the cube of the rows of self and other (same dimensions). """
+        if other.dimensions != self.dimensions:
+            raise ValueError(f"Cannot merge cubes of dimensions {self.dimensions} and {other.dimensions}")
+        cells = pd.concat([self.cells, other.cells]).groupby(level=self.dimensions, dropna=False, observed=True).sum()
+        return UsageCube(dimensions=self.dimensions, user_dimensions=self.user_dimensions, cells=cells)
+
+    def _locate(self, filters: dict) -> pd.DataFrame:
+        """ Return the cells matching filters {dimension: value or list of values}. """
+        unknown = [dim for dim in filters if dim not in self.dimensions]
+        if unknown:
+            raise ValueError(f"Unknown cube dimensions {unknown}, expected some of {self.dimensions}")
+        filters = {dim: value for dim, value in filters.items() if value is not None}
+        if not filters or self.cells.empty:
+            return self.cells
+
+        index = self.cells.index
+        # codes of the filter values in each filtered level: a value missing from the cells only matches nothing,
+        # the other values of its list are still selected
+        wanted = {}
+        for i, dim in enumerate(self.dimensions):
+            value = filters.get(dim)
+            if value is None:
+                continue
+            values = list(value) if isinstance(value, (list, tuple, set, pd.Series, pd.Index)) else [value]
+            codes = index.levels[i].get_indexer(values)
+            wanted[i] = np.unique(codes[codes >= 0])
+
+        # the cells sharing the codes of the first levels are a contiguous range, narrowed level by level:
+        # binary searches of the wanted codes for a filtered level, the runs of its codes for the other levels
+        ranges = [(0, len(index))]
+        for i in range(max(wanted) + 1):
+            level_codes = index.codes[i]
+            narrowed = []
+            for start, end in ranges:
+                range_codes = level_codes[start:end]
+                if i in wanted:
+                    lefts = np.searchsorted(range_codes, wanted[i], side='left')
+                    rights = np.searchsorted(range_codes, wanted[i], side='right')
+                else:
+                    lefts = np.r_[0, np.flatnonzero(np.diff(range_codes)) + 1]
+                    rights = np.r_[lefts[1:], len(range_codes)]
+                narrowed.extend((start + left, start + right) for left, right in zip(lefts, rights) if left < right)
+            ranges = narrowed
+        positions = np.concatenate([np.arange(start, end) for start, end in ranges]) if ranges else np.array([], dtype=int)
+        return self.cells.iloc[positions]
+
+    def subcube(self, **filters) -> 'UsageCube':
+        """ Return the cube restricted to filters, e.g. subcube(year=[2024, 2025]). """
+        return UsageCube(dimensions=self.dimensions, user_dimensions=self.user_dimensions, cells=self._locate(filters))
+
+    def slice(self, **filters) -> pd.DataFrame:
+        """ Return the cells matching filters as a DataFrame (dimensions + measures columns),
+        e.g. slice(institution_name='IAE Lille', year=2024). """
+        return self._locate(filters).reset_index()
+
+    def rollup(self, by: list, **filters) -> pd.DataFrame:
+        """ Aggregate the cells matching filters by the dimensions of by: sum of nb_codes, number of
+        extraction rows (nb_events) and number of distinct users (nb_users). Rows with a missing key are dropped. """
+        cells = self._locate(filters).reset_index()
+        # one id per distinct user (a missing name counts as one user, like drop_duplicates)
+        cells['user_id'] = cells.groupby(self.user_dimensions, dropna=False, observed=True).ngroup()
+        if not by:
+            return pd.DataFrame({'nb_codes': [cells['nb_codes'].sum()], 'nb_events': [cells['nb_events'].sum()],
+                                 'nb_users': [cells['user_id'].nunique()]})
+        return cells.groupby(list(by), observed=True).agg(nb_codes=('nb_codes', 'sum'), nb_events=('nb_events', 'sum'),
+                                           nb_users=('user_id', 'nunique')).reset_index()
+
+
+    def values(self, dimension: str, **filters) -> list:
+        """ Return the sorted distinct values of a dimension in the cells matching filters. """
+        return sorted(self._locate(filters).index.get_level_values(dimension).dropna().unique().tolist())
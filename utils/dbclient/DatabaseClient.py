@@ -9,6 +9,13 @@ Typical usage example:
 ---
 DbConnector('durango') 
 df = execute_query(self, query: str) -> pd.DataFrame
+for chunk in iter_query(self, query: str, chunksize: int = 50000): ...
+dfs = execute_many_concurrently(self, {'stats': query1, 'users': query2}) -> dict
+
+----
+Engines are shared: every DbConnector built with the same alias reuses the same
+pooled engine for the whole process. Call dispose_engines() at the end of a run
+to close all the pooled connections.
 
 ----
 Logging:
@@ -23,6 +30,7 @@ import os
 import sys
 from pathlib import Path
 import logging
+from concurrent.futures import ThreadPoolExecutor
 import psycopg2
 import sqlalchemy
 from sqlalchemy.orm import sessionmaker
@@ -50,8 +58,35 @@ def log_config(log_path: Path, name = __name__ ) -> object:
 
 db_logger = log_config(log_location())
 
+# Process-wide registry of pooled engines, keyed by database alias
+ENGINES = {}
+
+
+def get_engine(db_alias: str, url: URL, echo: bool = False, pool_size: int = 5, max_overflow: int = 10,
+               pool_pre_ping: bool = True) -> sqlalchemy.engine.Engine:
+    """
+    Return the pooled engine registered for db_alias, creating it on first use.
+    The pool settings are only applied when the engine is created.
+    """
+    db_alias = db_alias.upper()
+    if db_alias not in ENGINES:
+        db_logger.info('Creating pooled engine for %s (pool_size=%s, max_overflow=%s)', db_alias, pool_size, max_overflow)
+        ENGINES[db_alias] = create_engine(url, echo=echo, pool_size=pool_size, max_overflow=max_overflow,
+                                          pool_pre_ping=pool_pre_ping)
+    return ENGINES[db_alias]
+
+
+def dispose_engines() -> None:
+    """ Dispose every pooled engine of the registry and close their connections. """
+    for db_alias, engine in list(ENGINES.items()):
+        engine.dispose()
+        db_logger.info("Database engine %s disposed.", db_alias)
+    ENGINES.clear()
+
+
 class DbConnector:
-    def __init__(self, db_alias: str, echo: bool = False):
+    def __init__(self, db_alias: str, echo: bool = False, pool_size: int = None, max_overflow: int = None,
+                 pool_pre_ping: bool = True):
         db_alias = db_alias.upper()
         self.drivername = globals().get(f'{db_alias}_DRIVERNAME')
         if not self.drivername:
@@ -72,9 +107,16 @@ class DbConnector:
                               password=self.password,
                               host=self.host,
                               database=self.dbname)
+        # pool size can be set per alias in env_db_conn.py (e.g. YAKARI_POOL_SIZE), default to 5 + 10 overflow
+        if pool_size is None:
+            pool_size = int(globals().get(f'{db_alias}_POOL_SIZE', 5))
+        if max_overflow is None:
+            max_overflow = int(globals().get(f'{db_alias}_MAX_OVERFLOW', 10))
+
         try:
             db_logger.info('Connecting to the PostgreSQL database... %s', self.dbname)
-            self.engine = create_engine(self.url, echo=echo)
+            self.engine = get_engine(db_alias, self.url, echo=echo, pool_size=pool_size,
+                                     max_overflow=max_overflow, pool_pre_ping=pool_pre_ping)
             self.Session = sessionmaker(bind=self.engine)
 
         except Exception as e:
@@ -124,6 +166,49 @@ class DbConnector:
                     db_logger.error("An error occurred while executing the query: %s", sys.exc_info()[1])
                     return pd.DataFrame()
 
+    def iter_query(self, query: str, chunksize: int = 50000, params: dict = None):
+        """
+        Yield the result of the query as DataFrames of at most chunksize rows.
+        The rows are fetched through a server-side (named) psycopg2 cursor (stream_results),
+        so only one chunk is held in memory at a time.
+        """
+        if not query:
+            raise ValueError("Query cannot be empty or None")
+        with self.engine.connect() as connection:
+            connection = connection.execution_options(stream_results=True, max_row_buffer=chunksize)
+            try:
+                for chunk in pd.read_sql_query(sqlalchemy.text(query), connection, params=params, chunksize=chunksize):
+                    yield chunk
+                db_logger.info("Query executed successfully.")
+            except Exception as e:
+                # a partial result cannot be told apart from a complete one, so the error is raised
+                print("An error occurred while streaming the query: ", e)
+                db_logger.error("An error occurred while streaming the query: %s", sys.exc_info()[1])
+                raise
+
+    def execute_many_concurrently(self, queries: dict, max_workers: int = None) -> dict:
+        """
+        Run independent queries {name: query} at the same time, each on its own pooled connection,
+        and return {name: DataFrame} when they are all finished (latency of the slowest query, not of their sum).
+        A query with bound parameters is given as a (query, params) tuple (params None for none).
+        The queries are run by execute_query (execute_query_with_params) in a thread pool of max_workers threads
+        (default: one per query, at most the pool size of the engine).
+        """
+        if not queries:
+            return {}
+        if max_workers is None:
+            max_workers = min(len(queries), self.engine.pool.size())
+        db_logger.info("Running %s queries concurrently on %s connections.", len(queries), max_workers)
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f'{self.dbalias.lower()}-query') as executor:
+            futures = {}
+            for name, query in queries.items():
+                query, params = (query, None) if isinstance(query, str) else query
+                if params:
+                    futures[name] = executor.submit(self.execute_query_with_params, query, params)
+                else:
+                    futures[name] = executor.submit(self.execute_query, query)
+            return {name: future.result() for name, future in futures.items()}
+
     def execute_query_with_params(self, query: str, params: dict) -> pd.DataFrame:
         with self.engine.connect() as connection:
             if not query:
@@ -158,7 +243,9 @@ class DbConnector:
            
     
     def close(self):
+        """ Dispose the shared engine of this alias; the next DbConnector on this alias creates a new one. """
         self.engine.dispose()
+        ENGINES.pop(self.dbalias, None)
         db_logger.info("Database connection closed.")
         print("Database connection closed.")
 
@@ -5,6 +5,18 @@ Typical usage example:
     etl_pipeline = EtlPipeline(source_db_alias='mydatabase', target_db_alias='mydatabase')
     etl_pipeline.run()
 
+    table = extract_data_from_source(DbConnector('durango'), 'my_table', 'my_table.csv', compress=True, lazy=True)
+    for chunk in table.iter_chunks(100000): ...
+
+----
+The tables are exported with COPY (SELECT ...) TO STDOUT WITH CSV HEADER (psycopg2 copy_expert) straight to the
+file, optionally gzip compressed: the rows are streamed at wire speed and never held in a DataFrame.
+The file is read back with the dtypes of the query columns (PostgreSQL types of the result, see query_column_types).
+With lazy=True the file is returned as a CsvTableView, read only when (and as far as) it is used.
+With cache_ttl, load_data_from_source keeps a Parquet snapshot of the table (see utils.dbclient.ResultCache) and only
+extracts it again when the table changed (signature checked at each load) or, if its signature cannot be read,
+when the snapshot is older than cache_ttl seconds.
+
 ----
 Logging:
 - Log entries are written to a file named 'logfile.log'.
@@ -19,12 +31,19 @@ from pathlib import Path
 sys.path.append(str(Path(os.getcwd())))
 
 import re
+import gzip
 import logging
+from functools import cached_property
 import pandas as pd
 import uuid
 
 sys.path.append(str(Path(__file__).parent.parent))
 from utils.dbclient.DatabaseClient import DbConnector
+from utils.dbclient.ResultCache import ResultCache
+
+# folder of the Parquet snapshots of load_data_from_source, in its data_path
+CACHE_FOLDER = ".cache"
+CACHE_MAX_SIZE = 2 * 1024**3
 
 
 def sanitize_filename(test_str: str) -> str:
@@ -47,26 +66,146 @@ def sanitize_filename(test_str: str) -> str:
     return cleaned_filename
 
 
+# read_csv dtypes of the PostgreSQL type oids (bool, int8, int2, int4, float4, float8, numeric), the other columns are text
+PG_CSV_DTYPES = {16: 'boolean', 20: 'Int64', 21: 'Int64', 23: 'Int64', 700: 'float64', 701: 'float64', 1700: 'float64'}
+# date, timestamp, timestamptz
+PG_DATE_TYPES = {1082, 1114, 1184}
+
+
+def query_column_types(db_connector: DbConnector, query: str) -> tuple:
+    """
+    Return (dtype, parse_dates) for read_csv of the export of query, from the types of its result columns
+    (the query is run with LIMIT 0). Integers are nullable (Int64), dates and timestamps are parsed, text stays text.
+    """
+    raw_connection = db_connector.engine.raw_connection()
+    try:
+        cursor = raw_connection.cursor()
+        cursor.execute(f"SELECT * FROM ({query}) AS q LIMIT 0")
+        description = cursor.description
+        cursor.close()
+    finally:
+        raw_connection.close()
+    dtype = {column[0]: PG_CSV_DTYPES.get(column[1], str) for column in description if column[1] not in PG_DATE_TYPES}
+    parse_dates = [column[0] for column in description if column[1] in PG_DATE_TYPES]
+    return dtype, parse_dates
+
+
+class CsvTableView:
+    """
+    Lazy view of an exported CSV file (gzip compressed if its name ends with .gz): nothing is read until
+    the frame, a projection or the chunks are asked for. dtype and parse_dates are the read_csv types of the
+    columns (see query_column_types), booleans are written 't'/'f' by COPY.
+    """
+    def __init__(self, path: Path, dtype: dict = None, parse_dates: list = None):
+        self.path = Path(path)
+        self.dtype = dtype
+        self.parse_dates = parse_dates or []
+
+    def __repr__(self):
+        return f"CsvTableView(path={self.path})"
+
+    @property
+    def columns(self) -> list:
+        return pd.read_csv(self.path, nrows=0).columns.tolist()
+
+    def _read_csv_options(self, columns: list = None) -> dict:
+        parse_dates = [col for col in self.parse_dates if columns is None or col in columns]
+        return {'usecols': columns, 'dtype': self.dtype, 'parse_dates': parse_dates or None,
+                'true_values': ['t'], 'false_values': ['f']}
+
+    def read(self, columns: list = None) -> pd.DataFrame:
+        """ Read the file, only the columns of columns if given. """
+        return pd.read_csv(self.path, **self._read_csv_options(columns))
+
+    def iter_chunks(self, chunksize: int = 100000, columns: list = None):
+        """ Yield the rows of the file as DataFrames of at most chunksize rows. """
+        with pd.read_csv(self.path, chunksize=chunksize, **self._read_csv_options(columns)) as reader:
+            for chunk in reader:
+                yield chunk
+
+    @cached_property
+    def frame(self) -> pd.DataFrame:
+        """ The whole table, read once. """
+        return self.read()
+
+
+def export_path(store_path: Path, compress: bool = False) -> Path:
+    """ Return the path of the CSV export of store_path: suffix .csv (added if missing), .csv.gz if compress. """
+    store_path = Path(store_path)
+    if store_path.suffix == ".gz":
+        store_path = store_path.with_suffix("")
+    if store_path.suffix != ".csv":
+        store_path = store_path.with_name(store_path.name + ".csv")
+    if compress:
+        store_path = store_path.with_name(store_path.name + ".gz")
+    return store_path
+
+
+def export_query_to_csv(db_connector: DbConnector, query: str, store_path: Path, compress: bool = False) -> Path:
+    """
+    Stream the result of query to a CSV file (with header) through COPY ... TO STDOUT, gzip compressed if compress.
+    The file is written to a temp file renamed at the end, so a failed export leaves the previous file untouched.
+    Without psycopg2 (copy_expert), the rows are streamed by chunks with DbConnector.iter_query.
+    Returns the path of the written file (suffix .csv or .csv.gz).
+    """
+    store_path = export_path(store_path, compress)
+    store_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = store_path.with_name(store_path.name + ".tmp")
+
+    raw_connection = db_connector.engine.raw_connection()
+    try:
+        with (gzip.open(tmp_path, "wb") if compress else open(tmp_path, "wb")) as file:
+            cursor = raw_connection.cursor()
+            if hasattr(cursor, "copy_expert"):
+                cursor.copy_expert(f"COPY ({query}) TO STDOUT WITH (FORMAT csv, HEADER true, ENCODING 'UTF8')", file)
+                cursor.close()
+            else:
+                cursor.close()
+                header = True
+                for chunk in db_connector.iter_query(query):
+                    file.write(chunk.to_csv(index=False, header=header).encode("utf-8"))
+                    header = False
+        os.replace(tmp_path, store_path)
+    except Exception as e:
+        print(f"An error occurred while exporting the query: {str(e)}")
+        logging.error("An error occurred while exporting the query: %s", e)
+        tmp_path.unlink(missing_ok=True)
+        raise
+    finally:
+        raw_connection.close()
+    return store_path
+
+
+def source_query(source_table_name: str) -> str:
+    return f"SELECT * FROM {source_table_name}"
+
+
 def extract_data_from_source(
-    db_connector: DbConnector, source_table_name: str, filename: str, data_path: Path = Path.cwd() / "data"
-) -> pd.DataFrame:
+    db_connector: DbConnector, source_table_name: str, filename: str, data_path: Path = Path.cwd() / "data",
+    compress: bool = False, lazy: bool = False
+):
     """
     Extract data from source database.
+    The table is exported to data_path / filename with COPY (see export_query_to_csv) and read back from the file
+    with the dtypes of the table columns (nullable Int64 integers, parsed dates and timestamps).
     :param db_connector: DbConnector instance
     :param source_table_name: str
-    :return: pd.DataFrame
+    :param compress: bool, gzip the exported file (filename.gz)
+    :param lazy: bool, return a CsvTableView of the file instead of reading it
+    :return: pd.DataFrame (CsvTableView if lazy)
     """
-    query = f"SELECT * FROM {source_table_name}"
+    query = source_query(source_table_name)
     logging.info("Extracting data from source database...")
 
-    df = db_connector.execute_query(query)
-    saved_at = store_data_to_csv(
-        df=df, store_path= data_path / sanitize_filename(filename)
+    dtype, parse_dates = query_column_types(db_connector, query)
+    saved_at = export_query_to_csv(
+        db_connector, query, store_path=data_path / sanitize_filename(filename), compress=compress
     )
     print(f"Data extracted from source database and saved at {saved_at}")
     logging.info("Data extracted from source database and saved at %s", saved_at)
 
-    return df.copy()
+    table = CsvTableView(saved_at, dtype=dtype, parse_dates=parse_dates)
+    return table if lazy else table.frame
 
 
 def store_data_to_csv(df: pd.DataFrame, store_path: Path) -> str:
@@ -92,15 +231,43 @@ def store_data_to_csv(df: pd.DataFrame, store_path: Path) -> str:
 
     return store_path
 
-def load_data_from_source(db_name: str, source_table_name: str, filename: str, load_from_system_if_exists: bool = False, data_path: Path = Path.cwd() / "data"):
-    if os.path.exists(data_path / filename) and load_from_system_if_exists:
-        return pd.read_csv(data_path / filename)
+def load_data_from_source(db_name: str, source_table_name: str, filename: str, load_from_system_if_exists: bool = False, data_path: Path = Path.cwd() / "data",
+                          compress: bool = False, lazy: bool = False, cache_ttl: float = None, timestamp_column: str = None):
+    """
+    Return the table source_table_name of the database db_name.
+    The CSV export is data_path / filename with the .csv / .csv.gz suffix of export_path, in every case.
+    With cache_ttl (seconds), the table is read from its Parquet snapshot if the table did not change since the
+    snapshot (pg_stat_user_tables counters or max(timestamp_column), checked at each load), or, when that signature
+    cannot be read, if the snapshot is younger than cache_ttl. Otherwise it is exported again (COPY) and the
+    snapshot is rebuilt from the typed frame; it is a DataFrame, so lazy cannot be combined with cache_ttl.
+    """
+    if lazy and cache_ttl is not None:
+        raise ValueError("lazy=True cannot be combined with cache_ttl: the cached table is a DataFrame.")
+    local_path = export_path(data_path / sanitize_filename(filename), compress)
+    if os.path.exists(local_path) and load_from_system_if_exists:
+        table = CsvTableView(local_path)
+        return table if lazy else table.frame
+    elif cache_ttl is not None:
+        db_connector = DbConnector(db_name)
+        cache = ResultCache(data_path / CACHE_FOLDER, ttl=cache_ttl, max_size=CACHE_MAX_SIZE)
+        query = source_query(source_table_name)
+        df = cache.get(db_connector, source_table_name, query, timestamp_column)
+        if df is None:
+            signature = cache.table_signature(db_connector, source_table_name, timestamp_column)
+            # streamed COPY export (also the file of load_from_system_if_exists), read back with the column types
+            table = extract_data_from_source(db_connector, source_table_name, filename, data_path=data_path,
+                                             compress=compress, lazy=True)
+            df = table.frame
+            cache.put(db_connector, source_table_name, query, df, timestamp_column, signature=signature)
+        return df
     else:
         return extract_data_from_source(
             db_connector=DbConnector(db_name),
             source_table_name=source_table_name,
             filename=filename,
-            data_path=data_path
+            data_path=data_path,
+            compress=compress,
+            lazy=lazy
         )
     
 
@@ -0,0 +1,115 @@
+"""
+This script keeps local Parquet snapshots of query results, so slowly changing tables are not extracted again.
+Typical usage example:
+
+    cache = ResultCache(Path.cwd() / "data" / ".cache", ttl=3600, max_size=2 * 1024**3)
+    df = cache.get(db_connector, 'my_table', query)
+    if df is None:
+        df = db_connector.execute_query(query)
+        cache.put(db_connector, 'my_table', query, df)
+
+----
+The snapshots are keyed by (database alias, table, sha256 of the query) and keep the dtypes (Parquet).
+Each get() compares the signature of the table saved with the snapshot to its current one (one cheap query):
+the write counters of pg_stat_user_tables, or max(timestamp_column) if a timestamp column is given.
+The snapshot is used while the table did not change. When the signature cannot be read, ttl is a hard limit:
+the snapshot is used while it is younger than ttl seconds.
+Once the snapshots exceed max_size bytes, the least recently used ones are removed.
+"""
+import os
+import json
+import time
+import hashlib
+import logging
+from pathlib import Path
+import pandas as pd
+
+
+class ResultCache:
+    def __init__(self, cache_dir: Path, ttl: float = 3600, max_size: int = 1024**3):
+        self.cache_dir = Path(cache_dir)
+        self.ttl = ttl
+        self.max_size = max_size
+
+    def __repr__(self):
+        return f"ResultCache(cache_dir={self.cache_dir}, ttl={self.ttl}, max_size={self.max_size})"
+
+    def snapshot_path(self, db_alias: str, table: str, query: str) -> Path:
+        query_hash = hashlib.sha256(query.encode('utf-8')).hexdigest()[:16]
+        name = f"{db_alias.lower()}_{table}_{query_hash}".replace('/', '_').replace('.', '_')
+        return self.cache_dir / f"{name}.parquet"
+
+    @staticmethod
+    def metadata_path(path: Path) -> Path:
+        return path.with_suffix('.json')
+
+    def table_signature(self, db_connector, table: str, timestamp_column: str = None) -> str:
+        """ Return a value which changes when the table is modified, None if it cannot be read.
+        max(timestamp_column) if given, otherwise the insert/update/delete counters of pg_stat_user_tables. """
+        if timestamp_column:
+            df = db_connector.execute_query(f"SELECT max({timestamp_column}) AS signature FROM {table}")
+        else:
+            df = db_connector.execute_query_with_params(
+                "SELECT concat_ws(':', n_tup_ins, n_tup_upd, n_tup_del, n_live_tup) AS signature "
+                "FROM pg_stat_user_tables WHERE relid = to_regclass(:table)", {'table': table})
+        if df.empty or pd.isna(df['signature'].iloc[0]):
+            return None
+        return str(df['signature'].iloc[0])
+
+    def get(self, db_connector, table: str, query: str, timestamp_column: str = None) -> pd.DataFrame:
+        """ Return the cached result of query, None if there is no snapshot, if the table changed, or if its
+        signature cannot be read and the snapshot is older than ttl. """
+        path = self.snapshot_path(db_connector.dbalias, table, query)
+        metadata_path = self.metadata_path(path)
+        if not (path.exists() and metadata_path.exists()):
+            return None
+        metadata = json.loads(metadata_path.read_text(encoding='utf-8'))
+        signature = self.table_signature(db_connector, table, timestamp_column)
+        if signature is None or metadata['signature'] is None:
+            fresh = time.time() - metadata['created'] <= self.ttl
+        else:
+            fresh = signature == metadata['signature']
+        if not fresh:
+            logging.info("Cached result of %s is stale.", table)
+            return None
+        # the mtime of the snapshot is its last use (LRU eviction)
+        os.utime(path)
+        logging.info("Result of %s read from the cache %s", table, path)
+        return pd.read_parquet(path)
+
+    def put(self, db_connector, table: str, query: str, df: pd.DataFrame, timestamp_column: str = None,
+            signature: str = None) -> Path:
+        """ Save the result of query with the signature of the table, then evict the oldest snapshots.
+        signature should be read before running the query (table_signature), so a change made during the
+        extraction makes the snapshot stale; it is read now if not given. """
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        path = self.snapshot_path(db_connector.dbalias, table, query)
+        if signature is None:
+            signature = self.table_signature(db_connector, table, timestamp_column)
+        tmp_path = path.with_name(path.name + '.tmp')
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+        metadata = {'db_alias': db_connector.dbalias, 'table': table, 'query': query, 'created': time.time(),
+                    'signature': signature, 'rows': len(df)}
+        self.metadata_path(path).write_text(json.dumps(metadata), encoding='utf-8')
+        self.evict(keep=path)
+        return path
+
+    def evict(self, keep: Path = None) -> None:
+        """ Remove the least recently used snapshots (but keep) until they fit in max_size bytes. """
+        snapshots = sorted(self.cache_dir.glob('*.parquet'), key=lambda path: path.stat().st_mtime)
+        total_size = sum(path.stat().st_size for path in snapshots)
+        for path in snapshots:
+            if total_size <= self.max_size:
+                break
+            if path == keep:
+                continue
+            total_size -= path.stat().st_size
+            path.unlink()
+            self.metadata_path(path).unlink(missing_ok=True)
+            logging.info("Cached result %s evicted.", path)
+
+    def clear(self) -> None:
+        for path in self.cache_dir.glob('*.parquet'):
+            path.unlink()
+            self.metadata_path(path).unlink(missing_ok=True)